@@ -0,0 +1,8 @@
+"""Load `.env` once per process.
+
+Modules that read settings at import time import this first, so `.env` is
+parsed a single time no matter which module is imported first.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
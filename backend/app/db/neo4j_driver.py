@@ -1,20 +1,33 @@
 import os
 import logging
-from dotenv import load_dotenv
-from neo4j import GraphDatabase
-
-load_dotenv()
+import threading
+from functools import lru_cache
+import app.config  # noqa: F401  loads .env before the settings below are read
 
 # URI example for AuraDB: neo4j+s://<your-db-id>.databases.neo4j.io:7687
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "")
 NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+# total connections this host may open; split across gunicorn workers
+NEO4J_MAX_CONNECTIONS = int(os.getenv("NEO4J_MAX_CONNECTIONS", "100"))
 
 _driver = None
+# startup connects in a background thread while early requests may call get_driver()
+_init_lock = threading.Lock()
 
 
 def init_driver():
+    with _init_lock:
+        _init_driver()
+
+
+def pool_size() -> int:
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return max(2, NEO4J_MAX_CONNECTIONS // workers)
+
+
+def _init_driver():
     """Initialize the Neo4j driver and verify connectivity.
 
     For AuraDB use a `neo4j+s://...` URI and the provided username/password.
@@ -24,12 +37,16 @@ def init_driver():
     global _driver
     if _driver is not None:
         return
+    # imported here so the package loads in the warm-up thread, not
+    # on the worker's import path
+    from neo4j import GraphDatabase
 
     if not NEO4J_URI:
         raise RuntimeError("NEO4J_URI is not set")
 
     try:
-        _driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+        _driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD),
+                                       max_connection_pool_size=pool_size())
         # verify connectivity (this will raise if credentials/uri wrong)
         try:
             _driver.verify_connectivity()
@@ -45,7 +62,8 @@ def init_driver():
                 try:
                     alt_uri = NEO4J_URI.replace("neo4j+s://", "neo4j+ssc://", 1)
                     logging.warning("verify_connectivity failed for neo4j+s://, retrying with neo4j+ssc:// (insecure) to help diagnose TLS issues")
-                    _driver = GraphDatabase.driver(alt_uri, auth=(NEO4J_USER, NEO4J_PASSWORD))
+                    _driver = GraphDatabase.driver(alt_uri, auth=(NEO4J_USER, NEO4J_PASSWORD),
+                                                   max_connection_pool_size=pool_size())
                     _driver.verify_connectivity()
                     logging.warning("Connected to Neo4j using neo4j+ssc:// (certificate validation disabled). Use this only for testing.")
                     return
@@ -65,6 +83,18 @@ def init_driver():
         raise
 
 
+@lru_cache(maxsize=None)
+def neo4j_exceptions():
+    """The ``neo4j.exceptions`` module, imported on first use.
+
+    Meant for ``except neo4j_exceptions().ServiceUnavailable:`` clauses; an
+    except expression is only evaluated while an exception is being matched,
+    so request handlers don't import the package up front.
+    """
+    from neo4j import exceptions
+    return exceptions
+
+
 def get_driver():
     if _driver is None:
         init_driver()
@@ -0,0 +1,492 @@
+"""Named registry of the service-layer Cypher.
+
+Services use the module constants; ``REGISTRY`` maps each name to its text
+and the plan operators it is allowed to use, which is what
+``python -m app.db.query_plans`` checks against a seeded database.
+Operators listed in ``allow`` are deliberate (e.g. a label scan over the
+small ``OpenBooking`` label); anything else on the forbidden list fails.
+"""
+from typing import NamedTuple
+
+
+class Query(NamedTuple):
+    name: str
+    cypher: str
+    allow: frozenset
+    params: dict
+
+
+REGISTRY = {}
+
+
+def register(name: str, cypher: str, allow=(), *, params: dict) -> str:
+    """Add a query to REGISTRY and return its text.
+
+    ``params`` are sample values for every ``$param`` the query uses; the plan
+    check runs the query with them, so they should hit the seeded rows below.
+    """
+    if name in REGISTRY:
+        raise ValueError(f"Duplicate query name '{name}'")
+    REGISTRY[name] = Query(name, cypher, frozenset(allow), params)
+    return cypher
+
+
+# Sample data the plan check seeds (python -m app.db.query_plans --seed):
+# users i (every 10th one a driver: user 10*j is behind driver j) and bookings
+# i, requested by user i % 200 with status i % 5 from requested, accepted,
+# ongoing, completed, cancelled and, once accepted, driver i % 20.
+SEED = "planseed"
+SAMPLE_USER = f"{SEED}-user-1"
+SAMPLE_DRIVER = f"{SEED}-driver-1"
+SAMPLE_DRIVER_USER = f"{SEED}-user-0"
+SAMPLE_BOOKING = f"{SEED}-booking-0"  # requested
+SAMPLE_COMPLETED_BOOKING = f"{SEED}-booking-3"  # completed, user 3, driver 3
+SAMPLE_NOW = "2024-01-01T00:00:00"
+
+
+# --- users / auth -----------------------------------------------------------
+
+USER_CREATE = register("user.create", """
+CREATE (u:User {
+    user_id: $user_id, name: $name, email: $email,
+    phone_number: $phone_number, password_hash: $password_hash,
+    role: $role, created_at: datetime($created_at)
+})
+RETURN u
+""", params={
+    "user_id": f"{SEED}-new-user", "name": "n", "email": "new@example.com", "phone_number": "0",
+    "password_hash": "x", "role": "passenger", "created_at": SAMPLE_NOW,
+})
+
+USER_BY_EMAIL = register("user.by_email", """
+MATCH (u:User {email:$email}) RETURN u LIMIT 1
+""", params={"email": f"{SEED}1@example.com"})
+
+USER_GET = register("user.get", """
+MATCH (u:User {user_id:$user_id}) RETURN u LIMIT 1
+""", params={"user_id": SAMPLE_USER})
+
+# paging over all users is a label scan by design
+USER_LIST = register("user.list", """
+MATCH (u:User) RETURN u SKIP $skip LIMIT $limit
+""", allow={"NodeByLabelScan"}, params={"skip": 0, "limit": 100})
+
+USER_UPDATE = register("user.update", """
+MATCH (u:User {user_id:$user_id}) SET u += $props RETURN u
+""", params={"user_id": SAMPLE_USER, "props": {"name": "renamed"}})
+
+USER_DELETE = register("user.delete", """
+MATCH (u:User {user_id:$user_id}) DETACH DELETE u
+""", params={"user_id": SAMPLE_USER})
+
+# --- schema migrations ----------------------------------------------------------
+
+# one-time data migrations record a marker so later boots skip them
+SCHEMA_MIGRATION_DONE = register("schema.migration_done", """
+MATCH (m:SchemaMigration {name:$name}) RETURN count(m) > 0 AS done
+""", params={"name": "booking_status_labels"})
+
+SCHEMA_MIGRATION_MARK = register("schema.migration_mark", """
+MERGE (m:SchemaMigration {name:$name}) ON CREATE SET m.applied_at = datetime()
+""", params={"name": "booking_status_labels"})
+
+# --- bookings -----------------------------------------------------------------
+
+BOOKING_CREATE = register("booking.create", """
+MATCH (u:User {user_id:$user_id})
+CREATE (b:Booking:OpenBooking {
+    booking_id:$booking_id, user_id:$user_id,
+    pickup_location:$pickup_location, dropoff_location:$dropoff_location,
+    pickup_lat:$pickup_lat, pickup_lng:$pickup_lng,
+    dropoff_lat:$dropoff_lat, dropoff_lng:$dropoff_lng,
+    fare:$fare, status:'requested', created_at: datetime($created_at)
+})
+CREATE (u)-[:REQUESTED]->(b)
+RETURN b
+""", params={
+    "booking_id": f"{SEED}-new-booking", "user_id": SAMPLE_USER, "pickup_location": "A", "dropoff_location": "B",
+    "pickup_lat": None, "pickup_lng": None, "dropoff_lat": None, "dropoff_lng": None, "fare": 10.0,
+    "created_at": SAMPLE_NOW,
+})
+
+BOOKING_GET = register("booking.get", """
+MATCH (b:Booking {booking_id:$booking_id}) RETURN b LIMIT 1
+""", params={"booking_id": SAMPLE_BOOKING})
+
+BOOKING_GET_ARCHIVED = register("booking.get_archived", """
+MATCH (b:ArchivedBooking {booking_id:$booking_id}) RETURN b LIMIT 1
+""", params={"booking_id": SAMPLE_BOOKING})
+
+BOOKING_LIST = register("booking.list", """
+MATCH (b:Booking) RETURN b SKIP $skip LIMIT $limit
+""", allow={"NodeByLabelScan"}, params={"skip": 0, "limit": 100})
+
+BOOKING_FOR_DRIVER = register("booking.for_driver", """
+MATCH (d:Driver {driver_id:$driver_id})-[:ACCEPTED]->(b:Booking)
+RETURN b ORDER BY b.created_at DESC
+""", params={"driver_id": SAMPLE_DRIVER})
+
+BOOKING_FOR_DRIVER_WITH_ARCHIVE = register("booking.for_driver_with_archive", """
+MATCH (d:Driver {driver_id:$driver_id})-[:ACCEPTED]->(b:Booking|ArchivedBooking)
+RETURN b ORDER BY b.created_at DESC
+""", params={"driver_id": SAMPLE_DRIVER})
+
+# One bounded traversal for a passenger's history: the page of bookings is cut
+# first, then driver, payment and the passenger's rating are pulled per row
+# with pattern comprehensions and projected down to the fields the app shows.
+_RIDE_HISTORY = """
+MATCH (:User {{user_id:$user_id}})-[:REQUESTED]->(b:{booking})
+WITH b ORDER BY b.created_at DESC SKIP $skip LIMIT $limit
+RETURN b {{
+    .booking_id, .status, .pickup_location, .dropoff_location, .fare,
+    .created_at, .assigned_at, .completed_at, .cancelled_at,
+    driver: head([(d:Driver)-[:ACCEPTED]->(b) | d {{
+        .driver_id, .vehicle_plate, .rating,
+        name: head([(d)<-[:IS_DRIVER]-(du:User) | du.name])
+    }}]),
+    transaction: head([(b)-[:HAS_TRANSACTION]->(t:{transaction}) | t {{
+        .transaction_id, .amount, .payment_mode, .payment_status
+    }}]),
+    rating: head([(b)-[:HAS_RATING]->(r:Rating {{target:'driver'}}) | r {{.score, .comment}}])
+}} AS ride
+"""
+
+BOOKING_RIDE_HISTORY = register("booking.ride_history", _RIDE_HISTORY.format(
+    booking="Booking", transaction="Transaction"), params={"user_id": SAMPLE_USER, "skip": 0, "limit": 20})
+
+BOOKING_RIDE_HISTORY_WITH_ARCHIVE = register("booking.ride_history_with_archive", _RIDE_HISTORY.format(
+    booking="Booking|ArchivedBooking", transaction="Transaction|ArchivedTransaction"),
+    params={"user_id": SAMPLE_USER, "skip": 0, "limit": 20})
+
+BOOKING_STATUS = register("booking.status", """
+MATCH (b:Booking {booking_id:$booking_id}) RETURN b.status AS status LIMIT 1
+""", params={"booking_id": SAMPLE_BOOKING})
+
+# --- transactions -------------------------------------------------------------
+
+# The booking is matched first and the two users are looked up in correlated
+# subqueries (Apply over unique index seeks) instead of a comma-separated
+# MATCH, which plans as a CartesianProduct.
+TRANSACTION_CREATE = register("transaction.create", """
+MATCH (b:Booking {booking_id:$booking_id})
+CALL { WITH b MATCH (u:User {user_id:$user_id}) RETURN u }
+CALL { WITH b MATCH (d:User {user_id:$driver_id}) RETURN d }
+CREATE (t:Transaction {
+    transaction_id:$tx_id,
+    booking_id:$booking_id,
+    user_id:$user_id,
+    driver_id:$driver_id,
+    payment_mode:$payment_mode,
+    payment_status:$status,
+    amount:$amount,
+    created_at: datetime($created_at)
+})
+MERGE (u)-[:MADE]->(t)
+MERGE (b)-[:HAS_TRANSACTION]->(t)
+MERGE (d)-[:RECEIVED]->(t)
+RETURN t
+""", params={
+    "tx_id": f"{SEED}-new-tx", "booking_id": SAMPLE_COMPLETED_BOOKING, "user_id": SAMPLE_USER,
+    "driver_id": SAMPLE_DRIVER_USER, "payment_mode": "cash", "status": "pending", "amount": 10.0,
+    "created_at": SAMPLE_NOW,
+})
+
+# take the write lock before reading the old status, so of two concurrent
+# confirmations only the first sees a non-success "previous"
+TRANSACTION_CONFIRM = register("transaction.confirm", """
+MATCH (t:Transaction {transaction_id:$tx_id})
+SET t._lock = true
+REMOVE t._lock
+WITH t, t.payment_status AS previous
+SET t.payment_status='success'
+RETURN t, previous
+""", params={"tx_id": f"{SEED}-tx-{SAMPLE_COMPLETED_BOOKING}"})
+
+TRANSACTION_FOR_USER = register("transaction.for_user", """
+MATCH (u:User {user_id:$user_id})-[:MADE]->(t:Transaction)
+RETURN t ORDER BY t.created_at DESC
+""", params={"user_id": SAMPLE_USER})
+
+TRANSACTION_FOR_USER_WITH_ARCHIVE = register("transaction.for_user_with_archive", """
+MATCH (u:User {user_id:$user_id})-[:MADE]->(t:Transaction|ArchivedTransaction)
+RETURN t ORDER BY t.created_at DESC
+""", params={"user_id": SAMPLE_USER})
+
+TRANSACTION_FOR_DRIVER = register("transaction.for_driver", """
+MATCH (d:User {user_id:$driver_id})-[:RECEIVED]->(t:Transaction)
+RETURN t ORDER BY t.created_at DESC
+""", params={"driver_id": SAMPLE_DRIVER_USER})
+
+TRANSACTION_FOR_DRIVER_WITH_ARCHIVE = register("transaction.for_driver_with_archive", """
+MATCH (d:User {user_id:$driver_id})-[:RECEIVED]->(t:Transaction|ArchivedTransaction)
+RETURN t ORDER BY t.created_at DESC
+""", params={"driver_id": SAMPLE_DRIVER_USER})
+
+# A range on the raw property can use the created_at indexes; wrapping the
+# property in date() cannot. Past days are mostly archived, so both tiers are
+# read, each through its own index.
+TRANSACTION_DAILY_TOTAL = register("transaction.daily_total", """
+CALL {
+    MATCH (t:Transaction)
+    WHERE t.created_at >= datetime($start) AND t.created_at < datetime($end)
+    RETURN t.amount AS amount
+    UNION ALL
+    MATCH (t:ArchivedTransaction)
+    WHERE t.created_at >= datetime($start) AND t.created_at < datetime($end)
+    RETURN t.amount AS amount
+}
+RETURN sum(amount) AS total
+""", params={"start": "2024-01-01", "end": "2024-01-02"})
+
+# --- notifications ------------------------------------------------------------
+
+NOTIFICATION_CREATE = register("notification.create", """
+MATCH (u:User {user_id:$user_id})
+MERGE (n:Notification {notification_id:$nid})
+ON CREATE SET
+    n.user_id = $user_id,
+    n.title = $title,
+    n.message = $message,
+    n.type = $type,
+    n.read = false,
+    n.created_at = datetime($created_at)
+MERGE (u)-[:HAS_NOTIFICATION]->(n)
+RETURN n
+""", params={
+    "nid": f"{SEED}-new-notif", "user_id": SAMPLE_USER, "title": "t", "message": "m", "type": "info",
+    "created_at": SAMPLE_NOW,
+})
+
+NOTIFICATION_FOR_USER = register("notification.for_user", """
+MATCH (u:User {user_id:$user_id})-[:HAS_NOTIFICATION]->(n:Notification)
+RETURN n ORDER BY n.created_at DESC
+""", params={"user_id": SAMPLE_USER})
+
+NOTIFICATION_FOR_USER_WITH_ARCHIVE = register("notification.for_user_with_archive", """
+MATCH (u:User {user_id:$user_id})-[:HAS_NOTIFICATION]->(n:Notification|ArchivedNotification)
+RETURN n ORDER BY n.created_at DESC
+""", params={"user_id": SAMPLE_USER})
+
+NOTIFICATION_MARK_READ = register("notification.mark_read", """
+MATCH (n:Notification {notification_id:$nid})
+SET n.read = true
+RETURN n
+""", params={"nid": f"{SAMPLE_USER}-notif-1"})
+
+# --- drivers / presence -------------------------------------------------------
+
+DRIVER_CREATE = register("driver.create", """
+MATCH (u:User {user_id:$user_id})
+CREATE (d:Driver {driver_id:$driver_id, license_number:$license_number,
+                  vehicle_plate:$vehicle_plate, availability_status:$availability_status,
+                  rating:0.0, rating_count:0, rating_sum:0})
+CREATE (u)-[:IS_DRIVER]->(d)
+""", params={
+    "user_id": SAMPLE_DRIVER_USER, "driver_id": f"{SEED}-new-driver", "license_number": "L",
+    "vehicle_plate": None, "availability_status": "offline",
+})
+
+DRIVER_EXISTS = register("driver.exists", """
+MATCH (d:Driver {driver_id:$driver_id}) RETURN count(d) > 0 AS exists
+""", params={"driver_id": SAMPLE_DRIVER})
+
+DRIVER_PRESENCE_FLUSH = register("driver.presence_flush", """
+UNWIND $rows AS r
+MATCH (d:Driver {driver_id:r.driver_id})
+SET d.availability_status = r.status, d.last_seen_at = datetime(r.seen)
+""", params={"rows": [{"driver_id": SAMPLE_DRIVER, "status": "online", "seen": SAMPLE_NOW}]})
+
+DRIVER_PERSISTED_AVAILABLE = register("driver.persisted_available", """
+MATCH (d:Driver) WHERE d.availability_status IN $statuses
+RETURN d.driver_id AS driver_id
+""", params={"statuses": ["online", "busy"]})
+
+# --- ratings ------------------------------------------------------------------
+
+# Each rate query creates the rating and bumps the target's running count/sum
+# in the same statement, so reading a rating is a single property read.
+# rating_id is "<booking_id>:<target>", which the unique constraint turns into
+# "one rating per side per ride".
+_RATE = """
+{match}
+WHERE b.status = $completed{rater_check}
+  AND NOT EXISTS {{ (b)-[:HAS_RATING]->(:Rating {{target:$target}}) }}
+CREATE (r:Rating {{
+    rating_id: $booking_id + ':' + $target, booking_id:$booking_id, rater_id:$rater_id,
+    target:$target, target_id:$target_id, score:$score, comment:$comment,
+    created_at: datetime($created_at)
+}})
+CREATE (b)-[:HAS_RATING]->(r)
+CREATE (r)-[:RATES]->(t)
+SET t.rating_count = coalesce(t.rating_count, 0) + 1, t.rating_sum = coalesce(t.rating_sum, 0) + $score
+SET t.rating = toFloat(t.rating_sum) / t.rating_count
+RETURN r
+"""
+
+# booking 3 is completed, requested by user 3 and accepted by driver 3
+_SAMPLE_RATING = {"booking_id": SAMPLE_COMPLETED_BOOKING, "score": 5, "comment": None,
+                  "completed": "completed", "created_at": SAMPLE_NOW}
+
+# passenger rates the driver who accepted their booking
+RATING_RATE_DRIVER = register("rating.rate_driver", _RATE.format(
+    match="MATCH (b:Booking {booking_id:$booking_id})<-[:ACCEPTED]-(t:Driver {driver_id:$target_id})",
+    rater_check=" AND b.user_id = $rater_id"),
+    params={**_SAMPLE_RATING, "rater_id": f"{SEED}-user-3", "target": "driver", "target_id": f"{SEED}-driver-3"})
+
+# driver rates the passenger who requested the booking
+RATING_RATE_PASSENGER = register("rating.rate_passenger", _RATE.format(
+    match="MATCH (t:User {user_id:$target_id})-[:REQUESTED]->(b:Booking {booking_id:$booking_id})\n"
+          "      <-[:ACCEPTED]-(:Driver {driver_id:$rater_id})",
+    rater_check=""),
+    params={**_SAMPLE_RATING, "rater_id": f"{SEED}-driver-3", "target": "passenger", "target_id": f"{SEED}-user-3"})
+
+RATING_EXISTING = register("rating.existing", """
+MATCH (:Booking {booking_id:$booking_id})-[:HAS_RATING]->(r:Rating {target:$target})
+RETURN r LIMIT 1
+""", params={"booking_id": SAMPLE_COMPLETED_BOOKING, "target": "driver"})
+
+RATING_SUMMARY_DRIVER = register("rating.summary_driver", """
+MATCH (t:Driver {driver_id:$target_id})
+RETURN coalesce(t.rating, 0.0) AS rating, coalesce(t.rating_count, 0) AS rating_count
+""", params={"target_id": SAMPLE_DRIVER})
+
+RATING_SUMMARY_USER = register("rating.summary_user", """
+MATCH (t:User {user_id:$target_id})
+RETURN coalesce(t.rating, 0.0) AS rating, coalesce(t.rating_count, 0) AS rating_count
+""", params={"target_id": SAMPLE_USER})
+
+# Rebuilds every target's totals, so the label scan is the point. CALL ... IN
+# TRANSACTIONS must run as an auto-commit query (session.run).
+_RATING_RECOMPUTE = """
+MATCH (t:{label})
+CALL {{
+    WITH t
+    OPTIONAL MATCH (r:Rating)-[:RATES]->(t)
+    WITH t, count(r) AS c, sum(r.score) AS s
+    SET t.rating_count = c, t.rating_sum = s,
+        t.rating = CASE WHEN c = 0 THEN 0.0 ELSE toFloat(s) / c END
+}} IN TRANSACTIONS OF $batch ROWS
+"""
+
+RATING_RECOMPUTE_DRIVER = register("rating.recompute_driver", _RATING_RECOMPUTE.format(label="Driver"),
+                                   allow={"NodeByLabelScan"}, params={"batch": 1000})
+
+RATING_RECOMPUTE_USER = register("rating.recompute_user", _RATING_RECOMPUTE.format(label="User"),
+                                 allow={"NodeByLabelScan"}, params={"batch": 1000})
+
+# --- outbox -------------------------------------------------------------------
+
+OUTBOX_RECORD = register("outbox.record", """
+CREATE (e:OutboxEvent:PendingEvent {
+    event_id:$event_id, type:$type, payload:$payload,
+    attempts:0, created_at: datetime($created_at)
+})
+""", params={
+    "event_id": f"{SEED}-new-event", "type": "booking.requested", "payload": "{}", "created_at": SAMPLE_NOW,
+})
+
+# PendingEvent only holds undelivered events, so scanning it stays small
+OUTBOX_PENDING = register("outbox.pending", """
+MATCH (e:PendingEvent)
+RETURN e ORDER BY e.created_at LIMIT $limit
+""", allow={"NodeByLabelScan"}, params={"limit": 100})
+
+OUTBOX_MARK_FAILED = register("outbox.mark_failed", """
+UNWIND $rows AS row
+MATCH (e:OutboxEvent {event_id:row.event_id})
+SET e.attempts = coalesce(e.attempts, 0) + 1, e.last_error = row.error
+WITH e WHERE e.attempts >= $max_attempts
+REMOVE e:PendingEvent
+SET e:FailedEvent
+""", params={"rows": [{"event_id": f"{SEED}-event", "error": "x"}], "max_attempts": 10})
+
+OUTBOX_MARK_DELIVERED = register("outbox.mark_delivered", """
+UNWIND $ids AS id
+MATCH (e:OutboxEvent {event_id:id})
+REMOVE e:PendingEvent
+SET e.delivered_at = datetime()
+""", params={"ids": [f"{SEED}-event"]})
+
+# --- idempotency keys ---------------------------------------------------------
+
+IDEMPOTENCY_CLAIM = register("idempotency.claim", """
+MERGE (k:IdempotencyKey {key:$key})
+ON CREATE SET k.status = 'pending', k.fingerprint = $fingerprint, k.claim = $claim,
+              k.claimed_at = datetime(), k.expires_at = datetime() + duration({seconds:$ttl})
+SET k._lock = true
+WITH k
+FOREACH (_ IN CASE WHEN k.claim <> $claim AND (
+            k.expires_at < datetime() OR
+            (k.status = 'pending' AND k.claimed_at < datetime() - duration({seconds:$stale}))
+         ) THEN [1] ELSE [] END |
+    SET k.status = 'pending', k.fingerprint = $fingerprint, k.claim = $claim, k.response = null,
+        k.claimed_at = datetime(), k.expires_at = datetime() + duration({seconds:$ttl}))
+REMOVE k._lock
+RETURN k.claim = $claim AS mine, k.status AS status, k.response AS response, k.fingerprint AS fingerprint
+""", params={"key": f"{SEED}-key", "claim": "c", "fingerprint": "f", "ttl": 60, "stale": 300})
+
+# locked before the claim check, so a concurrent takeover either lands first
+# (n = 0) or waits for this transaction
+IDEMPOTENCY_FINISH = register("idempotency.finish", """
+MATCH (k:IdempotencyKey {key:$key})
+SET k._lock = true
+REMOVE k._lock
+WITH k WHERE k.claim = $claim
+SET k.status = 'done', k.response = $response
+RETURN count(k) AS n
+""", params={"key": f"{SEED}-key", "claim": "c", "response": "{}"})
+
+IDEMPOTENCY_RELEASE = register("idempotency.release", """
+MATCH (k:IdempotencyKey {key:$key, claim:$claim})
+WHERE k.status = 'pending'
+DELETE k
+""", params={"key": f"{SEED}-key", "claim": "c"})
+
+# --- archive / purge ----------------------------------------------------------
+# (the booking archive queries depend on the status labels and are registered
+# in app.services.archive_service)
+
+# pending cash payments stay live until confirmed
+ARCHIVE_TRANSACTIONS = register("archive.transactions", """
+MATCH (t:Transaction)
+WHERE t.payment_status = 'success' AND t.created_at < datetime() - duration({days:$days})
+WITH t LIMIT $batch
+REMOVE t:Transaction
+SET t:ArchivedTransaction, t.archived_at = datetime()
+RETURN count(t) AS n
+""", params={"days": 7, "batch": 500})
+
+ARCHIVE_NOTIFICATIONS = register("archive.notifications", """
+MATCH (x:Notification)
+WHERE x.read = true AND x.created_at < datetime() - duration({days:$days})
+WITH x LIMIT $batch
+REMOVE x:Notification
+SET x:ArchivedNotification, x.archived_at = datetime()
+RETURN count(x) AS n
+""", params={"days": 7, "batch": 500})
+
+# delivered outbox events have no readers left
+PURGE_IDEMPOTENCY_KEYS = register("purge.idempotency_keys", """
+MATCH (k:IdempotencyKey)
+WHERE k.expires_at < datetime()
+WITH k LIMIT $batch
+DELETE k
+RETURN count(*) AS n
+""", params={"batch": 500})
+
+PURGE_OUTBOX_EVENTS = register("purge.outbox_events", """
+MATCH (e:OutboxEvent)
+WHERE e.delivered_at < datetime() - duration({days:$days})
+WITH e LIMIT $batch
+DELETE e
+RETURN count(*) AS n
+""", params={"days": 7, "batch": 500})
+
+# dead letters never get a delivered_at; they age out from when they were recorded
+PURGE_FAILED_EVENTS = register("purge.failed_events", """
+MATCH (e:FailedEvent)
+WHERE e.created_at < datetime() - duration({days:$days})
+WITH e LIMIT $batch
+DELETE e
+RETURN count(*) AS n
+""", params={"days": 30, "batch": 500})
@@ -0,0 +1,238 @@
+"""Query plan regression check for the Cypher in app.db.queries.
+
+Runs every registered query under PROFILE (inside a transaction that is
+rolled back, so writes leave nothing behind) with the sample params it was
+registered with, against a seeded local Neo4j, and compares the plan with the
+recorded baseline (query_plan_baseline.json, committed next to this file).
+A query fails when:
+
+- its sample params don't cover every ``$param`` it uses, or it errors;
+- its plan contains a forbidden operator it does not explicitly allow;
+- its set of plan operators differs from the baseline (re-record with
+  --update-baseline if the new plan is intended), or it has no baseline;
+- its db hits grow past the baseline budget.
+
+Point NEO4J_URI at a throwaway local database, then:
+
+    python -m app.db.query_plans --seed               # create schema + sample data
+    python -m app.db.query_plans --update-baseline    # record current plans
+    python -m app.db.query_plans                      # check; exit code 1 on regression
+"""
+import os
+import re
+import sys
+import json
+import argparse
+from app.db.neo4j_driver import get_driver, close_driver, neo4j_exceptions
+from app.db.schema import ensure_schema
+from app.db.queries import REGISTRY, SEED
+# importing the services registers the queries they build at import time
+from app.services import (  # noqa: F401
+    archive_service, auth_service, booking_service, booking_state, notification_service, transaction_service,
+    user_service,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "query_plan_baseline.json")
+FORBIDDEN_OPERATORS = {"AllNodesScan", "NodeByLabelScan", "UnionNodeByLabelsScan", "CartesianProduct"}
+# db hits may grow by this factor (plus a small constant for tiny queries)
+DEFAULT_TOLERANCE = 1.5
+DB_HIT_SLACK = 20
+
+# the sample params in app.db.queries point at these rows
+SEED_USERS = 200
+SEED_BOOKINGS = 1000
+
+SEED_STATEMENTS = [
+    """
+    UNWIND range(0, $users - 1) AS i
+    MERGE (u:User {user_id: $seed + '-user-' + i})
+    SET u.name = 'User ' + i, u.email = $seed + i + '@example.com', u.phone_number = '0000',
+        u.role = CASE WHEN i % 10 = 0 THEN 'driver' ELSE 'passenger' END,
+        u.created_at = datetime()
+    """,
+    """
+    UNWIND range(0, $users / 10 - 1) AS i
+    MATCH (u:User {user_id: $seed + '-user-' + (i * 10)})
+    MERGE (d:Driver {driver_id: $seed + '-driver-' + i})
+    SET d.availability_status = 'online', d.rating = 0.0, d.rating_count = 0, d.rating_sum = 0
+    MERGE (u)-[:IS_DRIVER]->(d)
+    """,
+    """
+    UNWIND range(0, $bookings - 1) AS i
+    WITH i, ['requested', 'accepted', 'ongoing', 'completed', 'cancelled'][i % 5] AS status
+    MATCH (u:User {user_id: $seed + '-user-' + (i % $users)})
+    MERGE (b:Booking {booking_id: $seed + '-booking-' + i})
+    SET b.user_id = u.user_id, b.pickup_location = 'A', b.dropoff_location = 'B', b.fare = 50.0,
+        b.status = status, b.created_at = datetime() - duration({days: i % 30})
+    MERGE (u)-[:REQUESTED]->(b)
+    """,
+    """
+    MATCH (b:Booking) WHERE b.booking_id STARTS WITH $seed AND b.status <> 'requested'
+    WITH b, toInteger(split(b.booking_id, '-')[2]) AS i
+    MATCH (d:Driver {driver_id: $seed + '-driver-' + (i % ($users / 10))})
+    MERGE (d)-[:ACCEPTED]->(b)
+    """,
+    """
+    MATCH (u:User)-[:REQUESTED]->(b:Booking {status: 'completed'})<-[:ACCEPTED]-(:Driver)<-[:IS_DRIVER]-(du:User)
+    WHERE b.booking_id STARTS WITH $seed
+    MERGE (t:Transaction {transaction_id: $seed + '-tx-' + b.booking_id})
+    SET t.booking_id = b.booking_id, t.user_id = u.user_id, t.driver_id = du.user_id,
+        t.payment_mode = 'cash', t.payment_status = 'success', t.amount = b.fare, t.created_at = b.created_at
+    MERGE (u)-[:MADE]->(t)
+    MERGE (b)-[:HAS_TRANSACTION]->(t)
+    MERGE (du)-[:RECEIVED]->(t)
+    """,
+    """
+    MATCH (u:User) WHERE u.user_id STARTS WITH $seed
+    UNWIND range(0, 4) AS j
+    MERGE (n:Notification {notification_id: u.user_id + '-notif-' + j})
+    SET n.user_id = u.user_id, n.title = 't', n.message = 'm', n.type = 'info', n.read = (j % 2 = 0),
+        n.created_at = datetime() - duration({days: j})
+    MERGE (u)-[:HAS_NOTIFICATION]->(n)
+    """,
+]
+
+
+def seed():
+    ensure_schema()
+    driver = get_driver()
+    with driver.session() as session:
+        session.run("CALL db.awaitIndexes(300)").consume()
+        for stmt in SEED_STATEMENTS:
+            session.run(stmt, seed=SEED, users=SEED_USERS, bookings=SEED_BOOKINGS).consume()
+        booking_state.backfill_status_labels(session)
+        session.run("CALL db.awaitIndexes(300)").consume()
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get("children", []) or []:
+        yield from _walk(child)
+
+
+_PARAM = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)")
+
+
+def missing_params(query) -> list:
+    """``$params`` the query uses that its registered sample params lack."""
+    return sorted(set(_PARAM.findall(query.cypher)) - set(query.params))
+
+
+def profile(session, query):
+    """PROFILE one query in a rolled-back transaction; return operators and db hits.
+
+    CALL ... IN TRANSACTIONS can't run inside an explicit transaction, so those
+    queries are only planned (EXPLAIN, nothing executes) and report 0 db hits.
+    """
+    params = query.params
+    if "IN TRANSACTIONS" in query.cypher:
+        plan = session.run("EXPLAIN " + query.cypher, params).consume().plan
+    else:
+        tx = session.begin_transaction()
+        try:
+            plan = tx.run("PROFILE " + query.cypher, params).consume().profile
+        finally:
+            tx.rollback()
+    operators, db_hits = [], 0
+    for op in _walk(plan):
+        operators.append(op["operatorType"].split("@")[0])
+        db_hits += op.get("dbHits", 0) or 0
+    return {"operators": sorted(set(operators)), "db_hits": db_hits}
+
+
+def check(results, baseline, tolerance):
+    """Compare profiled plans (name -> profile() result, or {"error": msg})
+    with the baseline. Returns one message per failure."""
+    failures = []
+    for name, r in results.items():
+        if "error" in r:
+            failures.append(f"{name}: {r['error']}")
+            continue
+        bad = (set(r["operators"]) & FORBIDDEN_OPERATORS) - REGISTRY[name].allow
+        if bad:
+            failures.append(f"{name}: forbidden operator(s) {sorted(bad)}")
+        base = baseline.get(name)
+        if base is None:
+            failures.append(f"{name}: not in the baseline; record it with --update-baseline")
+            continue
+        added = sorted(set(r["operators"]) - set(base["operators"]))
+        removed = sorted(set(base["operators"]) - set(r["operators"]))
+        if added or removed:
+            failures.append(f"{name}: plan changed (added {added}, removed {removed}); "
+                            f"re-record with --update-baseline if intended")
+        budget = base["db_hits"] * tolerance + DB_HIT_SLACK
+        if r["db_hits"] > budget:
+            failures.append(f"{name}: {r['db_hits']} db hits exceeds budget {budget:.0f} "
+                            f"(baseline {base['db_hits']})")
+    return failures
+
+
+def profile_all(session, names):
+    results = {}
+    for name in names:
+        query = REGISTRY[name]
+        missing = missing_params(query)
+        if missing:
+            results[name] = {"error": f"no sample value for {', '.join('$' + p for p in missing)}"}
+            continue
+        try:
+            results[name] = profile(session, query)
+        except neo4j_exceptions().Neo4jError as e:
+            results[name] = {"error": f"{type(e).__name__}: {e.message}"}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cypher query plan regression check")
+    parser.add_argument("--seed", action="store_true", help="create schema and sample data, then exit")
+    parser.add_argument("--update-baseline", action="store_true", help="write current plans to the baseline file")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--only", help="comma-separated query names to check")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.seed:
+            seed()
+            print(f"Seeded {SEED_USERS} users and {SEED_BOOKINGS} bookings")
+            return 0
+
+        names = args.only.split(",") if args.only else sorted(REGISTRY)
+        driver = get_driver()
+        with driver.session() as session:
+            results = profile_all(session, names)
+    finally:
+        close_driver()
+
+    errors = {name: r["error"] for name, r in results.items() if "error" in r}
+    if args.update_baseline:
+        if errors:
+            for name, msg in errors.items():
+                print("FAIL", f"{name}: {msg}")
+            print("Baseline not written")
+            return 1
+        if args.only and os.path.exists(args.baseline):
+            # keep the other queries' entries
+            with open(args.baseline, encoding="utf-8") as f:
+                results = {**json.load(f), **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Recorded {len(results)} query plans in {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    for name, r in results.items():
+        if name not in errors:
+            print(f"{name:45} {r['db_hits']:8d} db hits  {', '.join(r['operators'])}")
+    failures = check(results, baseline, args.tolerance)
+    for msg in failures:
+        print("FAIL", msg)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
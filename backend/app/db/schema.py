@@ -0,0 +1,41 @@
+import logging
+from app.db.neo4j_driver import get_driver
+
+# Constraints and indexes the service layer relies on. Every statement is
+# idempotent (IF NOT EXISTS) so this can run on every startup.
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT user_id_unique IF NOT EXISTS FOR (u:User) REQUIRE u.user_id IS UNIQUE",
+    "CREATE INDEX user_email IF NOT EXISTS FOR (u:User) ON (u.email)",
+    "CREATE CONSTRAINT booking_id_unique IF NOT EXISTS FOR (b:Booking) REQUIRE b.booking_id IS UNIQUE",
+    "CREATE INDEX booking_status IF NOT EXISTS FOR (b:Booking) ON (b.status)",
+    "CREATE INDEX open_booking_created_at IF NOT EXISTS FOR (b:OpenBooking) ON (b.created_at)",
+    "CREATE INDEX archived_booking_id IF NOT EXISTS FOR (b:ArchivedBooking) ON (b.booking_id)",
+    "CREATE CONSTRAINT transaction_id_unique IF NOT EXISTS FOR (t:Transaction) REQUIRE t.transaction_id IS UNIQUE",
+    "CREATE INDEX transaction_created_at IF NOT EXISTS FOR (t:Transaction) ON (t.created_at)",
+    "CREATE INDEX archived_transaction_created_at IF NOT EXISTS FOR (t:ArchivedTransaction) ON (t.created_at)",
+    "CREATE INDEX notification_created_at IF NOT EXISTS FOR (n:Notification) ON (n.created_at)",
+    "CREATE CONSTRAINT notification_id_unique IF NOT EXISTS FOR (n:Notification) REQUIRE n.notification_id IS UNIQUE",
+    "CREATE CONSTRAINT outbox_event_id_unique IF NOT EXISTS FOR (e:OutboxEvent) REQUIRE e.event_id IS UNIQUE",
+    "CREATE INDEX pending_event_created_at IF NOT EXISTS FOR (e:PendingEvent) ON (e.created_at)",
+    "CREATE INDEX outbox_event_delivered_at IF NOT EXISTS FOR (e:OutboxEvent) ON (e.delivered_at)",
+    "CREATE INDEX failed_event_created_at IF NOT EXISTS FOR (e:FailedEvent) ON (e.created_at)",
+    "CREATE CONSTRAINT driver_id_unique IF NOT EXISTS FOR (d:Driver) REQUIRE d.driver_id IS UNIQUE",
+    "CREATE INDEX driver_availability_status IF NOT EXISTS FOR (d:Driver) ON (d.availability_status)",
+    "CREATE CONSTRAINT rating_id_unique IF NOT EXISTS FOR (r:Rating) REQUIRE r.rating_id IS UNIQUE",
+    "CREATE CONSTRAINT schema_migration_name_unique IF NOT EXISTS FOR (m:SchemaMigration) REQUIRE m.name IS UNIQUE",
+    "CREATE CONSTRAINT idempotency_key_unique IF NOT EXISTS FOR (k:IdempotencyKey) REQUIRE k.key IS UNIQUE",
+    "CREATE INDEX idempotency_key_expires_at IF NOT EXISTS FOR (k:IdempotencyKey) ON (k.expires_at)",
+]
+
+
+def ensure_schema():
+    """Create the constraints/indexes listed in SCHEMA_STATEMENTS."""
+    driver = get_driver()
+    with driver.session() as session:
+        for stmt in SCHEMA_STATEMENTS:
+            try:
+                session.run(stmt).consume()
+            except Exception as e:
+                # an existing index with a different name, or missing privileges
+                # on a shared database, should not keep the API from starting
+                logging.warning("Schema statement failed (%s): %s", stmt, e)
@@ -1,11 +1,19 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from app.routers import auth, users, drivers, bookings, transactions, ratings, notifications
-from app.db.neo4j_driver import init_driver, close_driver
+from app import config  # noqa: F401  must run before modules read settings
+from app.utils import startup
+import importlib
+import logging
 import os
+import threading
+from fastapi import FastAPI, Response
+from fastapi.middleware.cors import CORSMiddleware
+from app.utils.ratelimit import RateLimitMiddleware
 
 app = FastAPI(title="TRICY - Tricycle Transport API")
 
+# Rate limiting sits inside CORS so 429 responses still carry CORS headers.
+if os.getenv("RATE_LIMIT_ENABLED", "1") == "1":
+    app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS so the frontend dev server (and production frontends) can talk to this API.
 FRONTEND_ORIGINS = [o.strip() for o in os.getenv("FRONTEND_URLS", "http://localhost:3000").split(",") if o.strip()]
 app.add_middleware(
@@ -16,23 +24,85 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# include routers
-app.include_router(auth.router)
-app.include_router(users.router)
-app.include_router(drivers.router)
-app.include_router(bookings.router)
-app.include_router(transactions.router)
-app.include_router(ratings.router)
-app.include_router(notifications.router)
+# Routers are imported eagerly: FastAPI needs every route registered before it
+# serves (routing table and OpenAPI), and the router modules themselves are
+# cheap. What is lazy is the heavy work behind them: the neo4j package, the
+# driver connection and the passlib context all load on first use or in the
+# warm-up thread. Each import is timed for STARTUP_PROFILE.
+ROUTERS = ["auth", "users", "drivers", "bookings", "transactions", "ratings", "notifications"]
+for _name in ROUTERS:
+    with startup.timed(f"import app.routers.{_name}"):
+        _module = importlib.import_module(f"app.routers.{_name}")
+    app.include_router(_module.router)
+
+with startup.timed("import lifecycle modules"):
+    from app.db.neo4j_driver import init_driver, close_driver, get_driver
+    from app.db.schema import ensure_schema
+    from app.services.booking_state import ensure_status_labels
+    from app.services.archive_service import start_archiver, stop_archiver
+    from app.services.outbox import start_dispatcher, stop_dispatcher
+    from app.services.driver_presence import start_presence_flusher, stop_presence_flusher
+    from app.utils.shared_state import is_leader, release_leases
+
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "5"))
+_shutdown = threading.Event()
+
+
+def _warm_up():
+    # Connecting (and the neo4j+ssc fallback) can take seconds, so it runs off the
+    # startup path; /ready reports 503 until it is done.
+    while not _shutdown.is_set():
+        try:
+            with startup.timed("neo4j connect"):
+                init_driver()
+            break
+        except Exception as e:
+            logging.error("Neo4j not reachable yet, retrying in %ss: %s", STARTUP_RETRY_SECONDS, e)
+            _shutdown.wait(STARTUP_RETRY_SECONDS)
+    if _shutdown.is_set():
+        return
+    try:
+        with startup.timed("schema"):
+            ensure_schema()
+        # one-time migration: after the first run this is a single marker lookup,
+        # and with several workers only the lease holder checks it
+        if is_leader("migrations", 600):
+            with startup.timed("status label migration"):
+                with get_driver().session() as session:
+                    ensure_status_labels(session)
+        with startup.timed("warm-up query"):
+            with get_driver().session() as session:
+                session.run("RETURN 1").consume()
+    except Exception as e:
+        # the API can serve without these; they are retried on the next boot
+        logging.warning("Startup schema/warm-up step failed: %s", e)
+    start_archiver()
+    start_dispatcher()
+    start_presence_flusher()
+    startup.mark_ready()
+
 
 @app.on_event("startup")
 def on_startup():
-    init_driver()
+    threading.Thread(target=_warm_up, name="startup", daemon=True).start()
 
 @app.on_event("shutdown")
 def on_shutdown():
+    _shutdown.set()
+    stop_presence_flusher()
+    stop_dispatcher()
+    stop_archiver()
+    release_leases()
     close_driver()
 
 @app.get("/")
 def root():
     return {"message": "TRICY API running 🚴‍♂️"}
+
+@app.get("/ready")
+def ready(response: Response):
+    # readiness gate for load balancers/autoscalers; "/" stays a liveness check
+    if not startup.is_ready():
+        response.status_code = 503
+        return {"ready": False}
+    return {"ready": True, "startup": startup.timings()}
@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+class RatingCreate(BaseModel):
+    booking_id: str
+    rater_id: str  # passenger user_id when rating a driver, driver_id when rating a passenger
+    score: int = Field(..., ge=1, le=5)
+    comment: Optional[str] = None
+
+class RatingSummary(BaseModel):
+    rating: float
+    rating_count: int
+
+class RatingResponse(BaseModel):
+    rating_id: str
+    booking_id: str
+    rater_id: str
+    target: str
+    target_id: str
+    score: int
+    comment: Optional[str] = None
+    created_at: Optional[datetime] = None
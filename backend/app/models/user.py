@@ -22,3 +22,5 @@ class UserOut(BaseModel):
     phone_number: str
     role: str
     created_at: Optional[datetime] = None
+    rating: Optional[float] = None
+    rating_count: Optional[int] = None
@@ -1,14 +1,19 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Query
 from app.models.booking import BookingCreate, BookingOut
 from app.services.booking_service import BookingService
-from app.services.notification_service import NotificationService
+from app.services.booking_state import InvalidTransition, UnknownDriver
+from app.services import driver_presence
+from app.utils.idempotency import run_idempotent, IdempotencyError
 
 router = APIRouter(prefix="/bookings", tags=["bookings"])
 
 @router.post("", response_model=BookingOut)
-def create_booking(payload: BookingCreate):
-    b = BookingService.create_booking(payload)
-    return b
+def create_booking(payload: BookingCreate, idempotency_key: str | None = Header(None, alias="Idempotency-Key")):
+    try:
+        return run_idempotent("bookings.create", idempotency_key, payload,
+                              lambda: BookingService.create_booking(payload))
+    except IdempotencyError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
 @router.get("/{booking_id}")
 def get_booking(booking_id: str):
@@ -27,39 +32,64 @@ def list_bookings_by_status(status: str):
     return BookingService.list_bookings_by_status(status)
 
 
+@router.get("/user/{user_id}/history")
+def ride_history(user_id: str, skip: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100),
+                 include_archived: bool = False):
+    # bookings with driver, payment and rating in one query instead of one call per ride
+    return BookingService.ride_history(user_id, skip=skip, limit=limit, include_archived=include_archived)
+
+
 @router.get("/driver/{driver_id}")
-def list_bookings_for_driver(driver_id: str):
-    return BookingService.list_bookings_for_driver(driver_id)
+def list_bookings_for_driver(driver_id: str, include_archived: bool = False):
+    return BookingService.list_bookings_for_driver(driver_id, include_archived=include_archived)
 
 @router.post("/{booking_id}/assign/{driver_id}")
 def assign_driver(booking_id: str, driver_id: str):
-    booking = BookingService.assign_driver(booking_id, driver_id)
+    try:
+        booking = BookingService.assign_driver(booking_id, driver_id)
+    except InvalidTransition as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except UnknownDriver as e:
+        raise HTTPException(status_code=404, detail=str(e))
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
+    # take the driver out of the available set until they report back online
+    driver_presence.registry.set_status(driver_id, driver_presence.BUSY)
+    # the passenger is notified asynchronously from the booking.accepted event
+    return {"message": "Driver assigned", "booking": booking}
 
-    # create a notification for the passenger
+@router.post("/{booking_id}/start")
+def start_booking(booking_id: str):
     try:
-        NotificationService.create_notification(
-            booking.get("user_id"),
-            "Driver Assigned",
-            f"Your ride has been accepted by driver {driver_id}.",
-            type="booking",
-        )
-    except Exception:
-        # don't fail the request if notification creation errors out
-        pass
-
-    return {"message": "Driver assigned", "booking": booking}
+        b = BookingService.start_booking(booking_id)
+    except InvalidTransition as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not b:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return {"message": "Booking started", "booking": b}
 
 @router.post("/{booking_id}/complete")
 def complete_booking(booking_id: str):
-    BookingService.complete_booking(booking_id)
-    return {"message": "Booking completed"}
+    try:
+        b = BookingService.complete_booking(booking_id)
+    except InvalidTransition as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not b:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    # the ride is over: the driver can take the next one
+    if b.get("driver_id"):
+        driver_presence.registry.release(b["driver_id"])
+    return {"message": "Booking completed", "booking": b}
 
 
 @router.post("/{booking_id}/cancel")
 def cancel_booking(booking_id: str):
-    b = BookingService.cancel_booking(booking_id)
+    try:
+        b = BookingService.cancel_booking(booking_id)
+    except InvalidTransition as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if not b:
         raise HTTPException(status_code=404, detail="Booking not found")
+    if b.get("driver_id"):
+        driver_presence.registry.release(b["driver_id"])
     return {"message": "Booking cancelled", "booking": b}
@@ -2,6 +2,9 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from uuid import uuid4
 from app.db.neo4j_driver import get_driver
+from app.db import queries
+from app.services import driver_presence
+from app.services.driver_presence import registry
 
 router = APIRouter(prefix="/drivers", tags=["drivers"])
 
@@ -16,12 +19,53 @@ def create_driver(payload: DriverCreate):
     driver_id = str(uuid4())
     driver = get_driver()
     with driver.session() as session:
-        session.run("""
-        MATCH (u:User {user_id:$user_id})
-        CREATE (d:Driver {driver_id:$driver_id, license_number:$license_number,
-                          vehicle_plate:$vehicle_plate, availability_status:$availability_status, rating:0.0})
-        CREATE (u)-[:IS_DRIVER]->(d)
-        """, user_id=payload.user_id, driver_id=driver_id,
+        session.run(queries.DRIVER_CREATE, user_id=payload.user_id, driver_id=driver_id,
         license_number=payload.license_number, vehicle_plate=payload.vehicle_plate,
         availability_status=payload.availability_status)
+    if payload.availability_status in (driver_presence.ONLINE, driver_presence.BUSY):
+        registry.set_status(driver_id, payload.availability_status)
     return {"driver_id": driver_id}
+
+
+@router.get("/available")
+def list_available_drivers(limit: int = 100):
+    return {"count": registry.available_count(), "drivers": registry.available(limit)}
+
+
+@router.get("/available/count")
+def count_available_drivers():
+    return {"count": registry.available_count()}
+
+
+@router.get("/{driver_id}/status")
+def get_driver_status(driver_id: str):
+    return {"driver_id": driver_id, "availability_status": registry.status(driver_id)}
+
+
+def _set_available(driver_id: str, status: str):
+    if driver_presence.set_available(driver_id, status) is None:
+        raise HTTPException(status_code=404, detail="Driver not found")
+    return {"driver_id": driver_id, "availability_status": status}
+
+
+@router.post("/{driver_id}/online")
+def set_online(driver_id: str):
+    return _set_available(driver_id, driver_presence.ONLINE)
+
+
+@router.post("/{driver_id}/busy")
+def set_busy(driver_id: str):
+    return _set_available(driver_id, driver_presence.BUSY)
+
+
+@router.post("/{driver_id}/offline")
+def set_offline(driver_id: str):
+    return {"driver_id": driver_id, "availability_status": registry.set_status(driver_id, driver_presence.OFFLINE)}
+
+
+@router.post("/{driver_id}/heartbeat")
+def heartbeat(driver_id: str):
+    status = registry.heartbeat(driver_id)
+    if status is None:
+        raise HTTPException(status_code=409, detail="Driver is offline; go online first")
+    return {"driver_id": driver_id, "availability_status": status}
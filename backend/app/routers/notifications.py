@@ -5,9 +5,9 @@ from app.services.notification_service import NotificationService
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
 @router.get("/user/{user_id}")
-def get_notifications(user_id: str):
+def get_notifications(user_id: str, include_archived: bool = False):
     try:
-        notifs = NotificationService.get_user_notifications(user_id)
+        notifs = NotificationService.get_user_notifications(user_id, include_archived=include_archived)
         return notifs
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,8 +1,37 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from app.models.rating import RatingCreate, RatingResponse, RatingSummary
+from app.services.rating_service import RatingService, AlreadyRated, DRIVER, PASSENGER
 
 router = APIRouter(prefix="/ratings", tags=["ratings"])
 
-@router.post("/user/{user_id}/rate")
-def rate_user(user_id: str, payload: dict):
-    # implement rating creation in Neo4j if desired
-    return {"message": "Rating recorded (stub)"}
+def _rate(target: str, target_id: str, payload: RatingCreate):
+    try:
+        return RatingService.rate(target, target_id, payload)
+    except AlreadyRated as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/driver/{driver_id}/rate", response_model=RatingResponse)
+def rate_driver(driver_id: str, payload: RatingCreate):
+    # payload.rater_id is the passenger's user_id
+    return _rate(DRIVER, driver_id, payload)
+
+@router.post("/user/{user_id}/rate", response_model=RatingResponse)
+def rate_user(user_id: str, payload: RatingCreate):
+    # payload.rater_id is the rating driver's driver_id
+    return _rate(PASSENGER, user_id, payload)
+
+@router.get("/driver/{driver_id}", response_model=RatingSummary)
+def get_driver_rating(driver_id: str):
+    r = RatingService.get_summary(DRIVER, driver_id)
+    if not r:
+        raise HTTPException(status_code=404, detail="Driver not found")
+    return r
+
+@router.get("/user/{user_id}", response_model=RatingSummary)
+def get_user_rating(user_id: str):
+    r = RatingService.get_summary(PASSENGER, user_id)
+    if not r:
+        raise HTTPException(status_code=404, detail="User not found")
+    return r
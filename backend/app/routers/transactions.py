@@ -1,16 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header
 from app.models.transaction import TransactionCreate, TransactionResponse
 from app.services.transaction_service import TransactionService
+from app.utils.idempotency import run_idempotent, IdempotencyError
 
 router = APIRouter(prefix="/transactions", tags=["transactions"])
 
 @router.post("", response_model=TransactionResponse)
-def create_transaction(payload: TransactionCreate):
+def create_transaction(payload: TransactionCreate, idempotency_key: str | None = Header(None, alias="Idempotency-Key")):
     try:
-        t = TransactionService.create_transaction(payload)
-        # t is dict of created transaction
-        # convert created_at to ISO str if Neo4j returns datetime object; keep as-is for now
-        return t
+        # a retried payment returns the first transaction instead of charging twice
+        return run_idempotent("transactions.create", idempotency_key, payload,
+                              lambda: TransactionService.create_transaction(payload))
+    except IdempotencyError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -22,12 +24,12 @@ def confirm_cash(transaction_id: str):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/user/{user_id}")
-def get_user_transactions(user_id: str):
-    return TransactionService.get_user_transactions(user_id)
+def get_user_transactions(user_id: str, include_archived: bool = False):
+    return TransactionService.get_user_transactions(user_id, include_archived=include_archived)
 
 @router.get("/driver/{driver_id}")
-def get_driver_transactions(driver_id: str):
-    return TransactionService.get_driver_transactions(driver_id)
+def get_driver_transactions(driver_id: str, include_archived: bool = False):
+    return TransactionService.get_driver_transactions(driver_id, include_archived=include_archived)
 
 @router.get("/daily/{date}")
 def get_daily_total(date: str):
@@ -0,0 +1,148 @@
+"""Move old, settled records out of the labels hot queries match on.
+
+Archiving swaps the primary label (``Booking`` -> ``ArchivedBooking``,
+``Transaction`` -> ``ArchivedTransaction``, ``Notification`` ->
+``ArchivedNotification``) and keeps every relationship, so history reads can
+still reach archived records with a label expression when asked to.
+
+The same job purges expired ``IdempotencyKey`` nodes and old outbox events
+(delivered ones after OUTBOX_RETENTION_DAYS, dead letters after
+OUTBOX_FAILED_RETENTION_DAYS). Purging has its own retention settings and
+runs even when archiving is disabled (ARCHIVE_AFTER_DAYS=0).
+"""
+import os
+import logging
+import threading
+from app.db.neo4j_driver import get_driver
+from app.db import queries
+from app.services.booking_state import STATUS_LABELS, TIMESTAMP_FIELDS, COMPLETED, CANCELLED
+from app.utils.shared_state import is_leader
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+OUTBOX_FAILED_RETENTION_DAYS = int(os.getenv("OUTBOX_FAILED_RETENTION_DAYS", "30"))
+
+_ARCHIVE_BOOKINGS = """
+MATCH (b:{label})
+WHERE b.{field} < datetime() - duration({{days:$days}})
+WITH b LIMIT $batch
+REMOVE b:Booking:{label}
+SET b:ArchivedBooking, b.archived_at = datetime()
+RETURN count(b) AS n
+"""
+
+_ARCHIVE_QUERIES = {
+    # only finished rides; the status label keeps the candidate set small, so
+    # scanning it is intended
+    f"bookings_{status}": queries.register(
+        f"archive.bookings_{status}",
+        _ARCHIVE_BOOKINGS.format(label=STATUS_LABELS[status], field=TIMESTAMP_FIELDS[status]),
+        allow={"NodeByLabelScan"},
+        params={"days": 7, "batch": 500},
+    )
+    for status in (COMPLETED, CANCELLED)
+}
+_ARCHIVE_QUERIES.update({
+    "transactions": queries.ARCHIVE_TRANSACTIONS,
+    "notifications": queries.ARCHIVE_NOTIFICATIONS,
+})
+
+# deletes, independent of ARCHIVE_AFTER_DAYS
+_PURGE_QUERIES = {
+    "idempotency_keys": queries.PURGE_IDEMPOTENCY_KEYS,
+    "outbox_events": queries.PURGE_OUTBOX_EVENTS,
+    "failed_events": queries.PURGE_FAILED_EVENTS,
+}
+
+
+def _run_batched(query_map: dict, batch_size: int, **params):
+    driver = get_driver()
+    counts = {}
+    with driver.session() as session:
+        for name, query in query_map.items():
+            total = 0
+            while True:
+                res = session.run(query, batch=batch_size, **params).single()
+                n = res["n"] if res else 0
+                total += n
+                if n < batch_size:
+                    break
+            counts[name] = total
+    return counts
+
+
+class ArchiveService:
+    @staticmethod
+    def archive_once(days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE):
+        """Archive everything older than ``days``, one batch per transaction.
+
+        Returns the number of archived nodes per query name.
+        """
+        return _run_batched(_ARCHIVE_QUERIES, batch_size, days=days)
+
+    @staticmethod
+    def purge_expired(batch_size: int = ARCHIVE_BATCH_SIZE,
+                      outbox_days: int = OUTBOX_RETENTION_DAYS,
+                      failed_days: int = OUTBOX_FAILED_RETENTION_DAYS):
+        """Delete expired idempotency keys and outbox events past their retention.
+
+        A retention of 0 keeps those events forever. Returns deleted nodes per
+        query name.
+        """
+        # idempotency keys carry their own expires_at
+        retention = {"idempotency_keys": None, "outbox_events": outbox_days, "failed_events": failed_days}
+        counts = {}
+        for name, query in _PURGE_QUERIES.items():
+            days = retention[name]
+            if days == 0:
+                continue
+            params = {} if days is None else {"days": days}
+            counts.update(_run_batched({name: query}, batch_size, **params))
+        return counts
+
+
+_stop = threading.Event()
+_thread = None
+
+
+def _run():
+    while not _stop.is_set():
+        # with several workers only the lease holder archives
+        if not is_leader("archiver", ARCHIVE_INTERVAL_SECONDS * 3):
+            _stop.wait(ARCHIVE_INTERVAL_SECONDS)
+            continue
+        if ARCHIVE_AFTER_DAYS > 0:
+            try:
+                counts = ArchiveService.archive_once()
+                if any(counts.values()):
+                    logging.info("Archived records: %s", counts)
+            except Exception as e:
+                logging.warning("Archive run failed: %s", e)
+        try:
+            counts = ArchiveService.purge_expired()
+            if any(counts.values()):
+                logging.info("Purged expired records: %s", counts)
+        except Exception as e:
+            logging.warning("Purge run failed: %s", e)
+        _stop.wait(ARCHIVE_INTERVAL_SECONDS)
+
+
+def start_archiver():
+    """Start the periodic archive/purge job. ARCHIVE_AFTER_DAYS=0 turns off
+    archiving only; expired keys and old outbox events are still purged."""
+    global _thread
+    if _thread is not None:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="archiver", daemon=True)
+    _thread.start()
+
+
+def stop_archiver():
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
+        _thread = None
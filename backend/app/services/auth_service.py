@@ -1,4 +1,5 @@
 from app.db.neo4j_driver import get_driver
+from app.db import queries
 from app.utils.hashing import hash_password, verify_password
 from app.utils.auth import create_access_token
 from uuid import uuid4
@@ -10,17 +11,9 @@ class AuthService:
         user_id = str(uuid4())
         created_at = datetime.utcnow().isoformat()
         hashed = hash_password(data.password)
-        query = """
-        CREATE (u:User {
-            user_id: $user_id, name: $name, email: $email,
-            phone_number: $phone_number, password_hash: $password_hash,
-            role: $role, created_at: datetime($created_at)
-        })
-        RETURN u
-        """
         driver = get_driver()
         with driver.session() as session:
-            session.run(query, {
+            session.run(queries.USER_CREATE, {
                 "user_id": user_id,
                 "name": data.name,
                 "email": data.email,
@@ -35,7 +28,7 @@ class AuthService:
     def login(email: str, password: str):
         driver = get_driver()
         with driver.session() as session:
-            res = session.run("MATCH (u:User {email:$email}) RETURN u LIMIT 1", email=email).single()
+            res = session.run(queries.USER_BY_EMAIL, email=email).single()
             if not res:
                 return None
             user = dict(res["u"])
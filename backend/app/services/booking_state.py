@@ -0,0 +1,203 @@
+"""Booking lifecycle: requested -> accepted -> ongoing -> completed, or cancelled.
+
+Every status also has its own label (e.g. ``:OpenBooking`` for ``requested``)
+so status lists only touch nodes currently in that state instead of scanning
+every ``Booking``. Transitions are a single conditional write that first takes
+the booking's write lock and only then checks the current status, so two
+drivers racing to accept the same booking cannot both win: the loser blocks
+on the lock and then sees the winner's committed status.
+"""
+import argparse
+from datetime import datetime
+from app.db import queries
+
+REQUESTED = "requested"
+ACCEPTED = "accepted"
+ONGOING = "ongoing"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+
+STATUS_LABELS = {
+    REQUESTED: "OpenBooking",
+    ACCEPTED: "AcceptedBooking",
+    ONGOING: "OngoingBooking",
+    COMPLETED: "CompletedBooking",
+    CANCELLED: "CancelledBooking",
+}
+
+# target status -> statuses it may be entered from
+TRANSITIONS = {
+    ACCEPTED: (REQUESTED,),
+    ONGOING: (ACCEPTED,),
+    # the app lets drivers finish a ride straight from "accepted"
+    COMPLETED: (ACCEPTED, ONGOING),
+    CANCELLED: (REQUESTED, ACCEPTED),
+}
+
+# timestamp property written when a booking enters the status
+TIMESTAMP_FIELDS = {
+    ACCEPTED: "assigned_at",
+    ONGOING: "started_at",
+    COMPLETED: "completed_at",
+    CANCELLED: "cancelled_at",
+}
+
+_ALL_STATUS_LABELS = ":".join(STATUS_LABELS.values())
+
+
+class InvalidTransition(ValueError):
+    def __init__(self, booking_id: str, current: str, target: str):
+        self.booking_id = booking_id
+        self.current = current
+        self.target = target
+        super().__init__(f"Booking {booking_id} cannot go from '{current}' to '{target}'")
+
+
+class UnknownDriver(LookupError):
+    def __init__(self, driver_id: str):
+        self.driver_id = driver_id
+        super().__init__(f"Driver {driver_id} not found")
+
+
+def _transition_query(target: str, with_driver: bool) -> str:
+    # labels and property names can't be parameters, but they only ever come
+    # from the constant tables above
+    # A plain read doesn't lock under read-committed, so a WHERE on b.status
+    # alone lets two concurrent transitions both pass. Touching a property
+    # takes the node's write lock (held until commit) before the status is
+    # read; it is removed again straight away so a rejected transition leaves
+    # nothing behind.
+    match = (
+        "MATCH (b:Booking {booking_id:$booking_id})\n"
+        "SET b._lock = true\n"
+        "REMOVE b._lock\n"
+        "WITH b WHERE b.status IN $from_statuses\n"
+    )
+    if with_driver:
+        # only registered drivers can accept; an unknown id matches nothing
+        match += "MATCH (d:Driver {driver_id:$driver_id})\nMERGE (d)-[:ACCEPTED]->(b)\n"
+    return match + (
+        f"REMOVE b:{_ALL_STATUS_LABELS}\n"
+        f"SET b:{STATUS_LABELS[target]}, b.status = $target, "
+        f"b.{TIMESTAMP_FIELDS[target]} = datetime($now)\n"
+        # the assigned driver, so callers can free them when the ride ends
+        "RETURN b, head([(assigned:Driver)-[:ACCEPTED]->(b) | assigned.driver_id]) AS driver_id"
+    )
+
+
+_QUERIES = {
+    target: queries.register(
+        f"booking.transition.{target}",
+        _transition_query(target, target == ACCEPTED),
+        params={"booking_id": queries.SAMPLE_BOOKING, "from_statuses": list(TRANSITIONS[target]),
+                "target": target, "now": queries.SAMPLE_NOW, "driver_id": queries.SAMPLE_DRIVER},
+    )
+    for target in TRANSITIONS
+}
+
+# status lists scan only the (small) per-status label
+BY_STATUS_QUERIES = {
+    status: queries.register(
+        f"booking.by_status.{status}",
+        f"MATCH (b:{label}) RETURN b ORDER BY b.created_at DESC",
+        allow={"NodeByLabelScan"},
+        params={},
+    )
+    for status, label in STATUS_LABELS.items()
+}
+
+
+def transition(session, booking_id: str, target: str, **params):
+    """Move a booking to ``target`` if its current status allows it.
+
+    Returns the updated booking node as a dict (plus the assigned
+    ``driver_id``, if any), None if the booking does not exist, and raises
+    InvalidTransition if it exists in a state that cannot move to ``target``.
+    Accepting requires a ``driver_id`` param and raises UnknownDriver if no
+    Driver has that id.
+    """
+    if target not in TRANSITIONS:
+        raise ValueError(f"Unknown booking status '{target}'")
+    res = session.run(_QUERIES[target], {
+        "booking_id": booking_id,
+        "from_statuses": list(TRANSITIONS[target]),
+        "target": target,
+        "now": datetime.utcnow().isoformat(),
+        **params,
+    }).single()
+    if res:
+        return {**dict(res["b"]), "driver_id": res["driver_id"]}
+    # nothing matched: tell "missing" apart from "wrong state" and "no such driver"
+    cur = session.run(queries.BOOKING_STATUS, booking_id=booking_id).single()
+    if not cur:
+        return None
+    if "driver_id" in params and cur["status"] in TRANSITIONS[target]:
+        found = session.run(queries.DRIVER_EXISTS, driver_id=params["driver_id"]).single()
+        if not (found and found["exists"]):
+            raise UnknownDriver(params["driver_id"])
+    raise InvalidTransition(booking_id, cur["status"], target)
+
+
+_BACKFILL_QUERIES = {
+    status: queries.register(f"booking.backfill_label.{status}", f"""
+MATCH (b:Booking {{status:$status}})
+WHERE NOT b:{label}
+WITH b LIMIT $batch
+SET b:{label}
+RETURN count(b) AS n
+""", params={"status": status, "batch": 1000})
+    for status, label in STATUS_LABELS.items()
+}
+
+
+STATUS_LABEL_MIGRATION = "booking_status_labels"
+
+
+def backfill_status_labels(session, batch_size: int = 1000) -> int:
+    """Label pre-existing bookings with their status label. Safe to re-run.
+
+    This scans every Booking, so startup goes through ensure_status_labels,
+    which only runs it once per database.
+    """
+    total = 0
+    for status in STATUS_LABELS:
+        while True:
+            res = session.run(_BACKFILL_QUERIES[status], status=status, batch=batch_size).single()
+            n = res["n"] if res else 0
+            total += n
+            if n < batch_size:
+                break
+    return total
+
+
+def ensure_status_labels(session):
+    """Run the status label backfill unless this database already has it.
+
+    Returns the number of bookings labelled, or None when it had already run.
+    """
+    done = session.run(queries.SCHEMA_MIGRATION_DONE, name=STATUS_LABEL_MIGRATION).single()
+    if done and done["done"]:
+        return None
+    n = backfill_status_labels(session)
+    session.run(queries.SCHEMA_MIGRATION_MARK, name=STATUS_LABEL_MIGRATION).consume()
+    return n
+
+
+if __name__ == "__main__":
+    from app.db.neo4j_driver import get_driver, close_driver
+
+    parser = argparse.ArgumentParser(description="Booking status label maintenance")
+    parser.add_argument("--backfill", action="store_true",
+                        help="label every booking with its status label, even if the migration already ran")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    if args.backfill:
+        try:
+            with get_driver().session() as session:
+                n = backfill_status_labels(session, args.batch_size)
+                session.run(queries.SCHEMA_MIGRATION_MARK, name=STATUS_LABEL_MIGRATION).consume()
+        finally:
+            close_driver()
+        print(f"Labelled {n} bookings")
+    else:
+        parser.print_help()
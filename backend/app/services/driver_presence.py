@@ -0,0 +1,233 @@
+"""In-memory driver presence with heartbeat expiry.
+
+Drivers report ``online``/``busy``/``offline`` and send heartbeats; a driver
+whose last heartbeat is older than DRIVER_HEARTBEAT_TTL_SECONDS drops to
+``offline``. The available set lives in memory so counting/listing available
+drivers never touches the graph. Changes are written to
+``Driver.availability_status`` in batches by a background flusher.
+
+The registry starts empty after a restart, so when the flusher starts it
+marks drivers the graph still has as online/busy offline unless the registry
+knows them; they come back with their next ``online`` call.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from app.db.neo4j_driver import get_driver
+from app.db import queries
+from app.utils.shared_state import Shared
+
+DRIVER_HEARTBEAT_TTL_SECONDS = float(os.getenv("DRIVER_HEARTBEAT_TTL_SECONDS", "60"))
+DRIVER_PRESENCE_FLUSH_SECONDS = float(os.getenv("DRIVER_PRESENCE_FLUSH_SECONDS", "5"))
+
+ONLINE = "online"
+BUSY = "busy"
+OFFLINE = "offline"
+STATUSES = (ONLINE, BUSY, OFFLINE)
+
+
+class PresenceRegistry:
+    def __init__(self, ttl: float = DRIVER_HEARTBEAT_TTL_SECONDS):
+        self.ttl = ttl
+        # driver_id -> (status, last_seen monotonic, last_seen utc), oldest heartbeat first
+        self._seen = OrderedDict()
+        self._available = set()
+        # driver_id -> (status, last_seen utc) not yet persisted
+        self._dirty = {}
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        # heartbeats are kept in arrival order, so only the head can be stale
+        while self._seen:
+            driver_id, (status, seen, _) = next(iter(self._seen.items()))
+            if now - seen <= self.ttl:
+                break
+            self._seen.popitem(last=False)
+            self._available.discard(driver_id)
+            self._dirty[driver_id] = (OFFLINE, datetime.utcnow())
+
+    def set_status(self, driver_id: str, status: str):
+        if status not in STATUSES:
+            raise ValueError(f"Unknown availability status '{status}'")
+        now = time.monotonic()
+        utc = datetime.utcnow()
+        with self._lock:
+            self._expire(now)
+            self._seen.pop(driver_id, None)
+            if status == OFFLINE:
+                self._available.discard(driver_id)
+            else:
+                self._seen[driver_id] = (status, now, utc)
+                if status == ONLINE:
+                    self._available.add(driver_id)
+                else:
+                    self._available.discard(driver_id)
+            self._dirty[driver_id] = (status, utc)
+        return status
+
+    def release(self, driver_id: str):
+        """Put a busy driver back online once their ride has ended.
+
+        Drivers that aren't busy (offline, expired, already online) are left
+        alone. Returns the driver's status afterwards.
+        """
+        now = time.monotonic()
+        utc = datetime.utcnow()
+        with self._lock:
+            self._expire(now)
+            entry = self._seen.get(driver_id)
+            if entry is None:
+                return OFFLINE
+            if entry[0] != BUSY:
+                return entry[0]
+            self._seen.pop(driver_id)
+            self._seen[driver_id] = (ONLINE, now, utc)
+            self._available.add(driver_id)
+            self._dirty[driver_id] = (ONLINE, utc)
+            return ONLINE
+
+    def heartbeat(self, driver_id: str):
+        """Refresh a driver's TTL. Returns its status, or None if it isn't online/busy."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._seen.pop(driver_id, None)
+            if entry is None:
+                return None
+            self._seen[driver_id] = (entry[0], now, datetime.utcnow())
+            return entry[0]
+
+    def status(self, driver_id: str):
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._seen.get(driver_id)
+            return entry[0] if entry else OFFLINE
+
+    def available_count(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._available)
+
+    def available(self, limit: int = 100):
+        with self._lock:
+            self._expire(time.monotonic())
+            out = []
+            for driver_id in self._available:
+                if len(out) >= limit:
+                    break
+                out.append(driver_id)
+            return out
+
+    def drain_dirty(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def mark_offline_unless_present(self, driver_ids) -> int:
+        """Queue an offline write for each driver the registry isn't tracking."""
+        utc = datetime.utcnow()
+        with self._lock:
+            self._expire(time.monotonic())
+            stale = [d for d in driver_ids if d not in self._seen]
+            for driver_id in stale:
+                self._dirty.setdefault(driver_id, (OFFLINE, utc))
+            return len(stale)
+
+    def restore_dirty(self, dirty: dict):
+        # put back a failed batch without clobbering newer changes
+        with self._lock:
+            for driver_id, value in dirty.items():
+                self._dirty.setdefault(driver_id, value)
+
+
+# one registry per host: shared by all workers under gunicorn
+registry = Shared("driver_presence")
+
+
+def _driver_exists(driver_id: str) -> bool:
+    driver = get_driver()
+    with driver.session() as session:
+        res = session.run(queries.DRIVER_EXISTS, driver_id=driver_id).single()
+        return bool(res and res["exists"])
+
+
+def set_available(driver_id: str, status: str, reg=registry):
+    """Mark a driver online or busy. Returns None if no Driver has this id.
+
+    The graph is only checked when the driver comes from offline, so
+    online/busy switches stay in memory.
+    """
+    if reg.status(driver_id) == OFFLINE and not _driver_exists(driver_id):
+        return None
+    return reg.set_status(driver_id, status)
+
+
+def flush(reg=registry) -> int:
+    """Persist pending status changes in one UNWIND write."""
+    dirty = reg.drain_dirty()
+    if not dirty:
+        return 0
+    rows = [{"driver_id": d, "status": s, "seen": ts.isoformat()} for d, (s, ts) in dirty.items()]
+    try:
+        driver = get_driver()
+        with driver.session() as session:
+            session.run(queries.DRIVER_PRESENCE_FLUSH, rows=rows).consume()
+    except Exception:
+        reg.restore_dirty(dirty)
+        raise
+    return len(rows)
+
+
+def reconcile(reg=registry) -> int:
+    """Set drivers persisted as online/busy but unknown to the registry to offline."""
+    driver = get_driver()
+    with driver.session() as session:
+        res = session.run(queries.DRIVER_PERSISTED_AVAILABLE, statuses=[ONLINE, BUSY])
+        driver_ids = [r["driver_id"] for r in res]
+    stale = reg.mark_offline_unless_present(driver_ids)
+    if stale:
+        flush(reg)
+    return stale
+
+
+_stop = threading.Event()
+_thread = None
+
+
+def _run():
+    try:
+        stale = reconcile()
+        if stale:
+            logging.info("Marked %d drivers without a live session offline", stale)
+    except Exception as e:
+        logging.warning("Driver presence reconcile failed: %s", e)
+    while not _stop.wait(DRIVER_PRESENCE_FLUSH_SECONDS):
+        try:
+            flush()
+        except Exception as e:
+            logging.warning("Driver presence flush failed: %s", e)
+
+
+def start_presence_flusher():
+    global _thread
+    if _thread is not None:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="driver-presence", daemon=True)
+    _thread.start()
+
+
+def stop_presence_flusher():
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
+        _thread = None
+    try:
+        flush()
+    except Exception as e:
+        logging.warning("Final driver presence flush failed: %s", e)
@@ -0,0 +1,172 @@
+"""Transactional outbox for booking and payment events.
+
+Services call ``record_event(tx, ...)`` inside the same Neo4j transaction as
+the state change, so an event exists if and only if the change committed.
+A background dispatcher reads pending events in batches and hands them to the
+registered sinks. Delivery is at-least-once: an event is only marked
+delivered after every sink accepted it, so sinks must tolerate repeats (use
+``event_id`` to dedupe). Failures are tracked per event: when a sink rejects a
+batch it is retried one event at a time, and only the events that still fail
+are retried later or, after OUTBOX_MAX_ATTEMPTS, parked as ``FailedEvent``.
+"""
+import os
+import json
+import logging
+import threading
+from uuid import uuid4
+from datetime import datetime
+from app.db.neo4j_driver import get_driver
+from app.db import queries
+from app.services.notification_service import NotificationService
+from app.utils.shared_state import is_leader
+
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_FILE = os.getenv("OUTBOX_FILE", "")
+
+
+def record_event(tx, event_type: str, payload: dict):
+    """Write an event in the caller's transaction and return its id."""
+    event_id = str(uuid4())
+    tx.run(queries.OUTBOX_RECORD, event_id=event_id, type=event_type, payload=json.dumps(payload, default=str),
+        created_at=datetime.utcnow().isoformat()).consume()
+    return event_id
+
+
+# (event types or None for all, sink) pairs; a sink takes a list of event dicts
+_sinks = []
+
+
+def register_sink(sink, event_types=None):
+    _sinks.append((set(event_types) if event_types else None, sink))
+
+
+def clear_sinks():
+    _sinks.clear()
+
+
+class FileSink:
+    """Append events as JSON lines to a local file (e.g. for a log shipper)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, events):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for e in events:
+                f.write(json.dumps(e, default=str) + "\n")
+
+
+def notification_sink(events):
+    """Create passenger notifications for booking events."""
+    for e in events:
+        p = e["payload"]
+        if e["type"] == "booking.accepted":
+            NotificationService.create_notification(
+                p.get("user_id"),
+                "Driver Assigned",
+                f"Your ride has been accepted by driver {p.get('driver_id')}.",
+                type="booking",
+                # derived from the event so redelivery doesn't duplicate it
+                notification_id=e["event_id"],
+            )
+
+
+def _fetch_pending(session, limit: int):
+    res = session.run(queries.OUTBOX_PENDING, limit=limit)
+    out = []
+    for r in res:
+        e = dict(r["e"])
+        out.append({
+            "event_id": e["event_id"],
+            "type": e["type"],
+            "payload": json.loads(e.get("payload") or "{}"),
+            "attempts": e.get("attempts", 0),
+            "created_at": e.get("created_at"),
+        })
+    return out
+
+
+def _deliver(sink, batch) -> dict:
+    """Hand ``batch`` to ``sink``; return {event_id: error} for the events it rejected."""
+    try:
+        sink(batch)
+        return {}
+    except Exception as ex:
+        if len(batch) == 1:
+            return {batch[0]["event_id"]: str(ex)}
+    # find the bad event(s) instead of failing the whole batch
+    failed = {}
+    for e in batch:
+        try:
+            sink([e])
+        except Exception as ex:
+            failed[e["event_id"]] = str(ex)
+    return failed
+
+
+def dispatch_once(limit: int = OUTBOX_BATCH_SIZE) -> int:
+    """Deliver one batch of pending events. Returns how many were delivered."""
+    driver = get_driver()
+    with driver.session() as session:
+        events = _fetch_pending(session, limit)
+        if not events:
+            return 0
+        failed = {}
+        for types, sink in _sinks:
+            batch = [e for e in events if types is None or e["type"] in types]
+            if batch:
+                for event_id, error in _deliver(sink, batch).items():
+                    failed.setdefault(event_id, error)
+        if failed:
+            logging.warning("Outbox delivery failed for %d of %d events", len(failed), len(events))
+            # park events that keep failing so they stop blocking the queue
+            session.run(queries.OUTBOX_MARK_FAILED, rows=[{"event_id": i, "error": err} for i, err in failed.items()],
+                max_attempts=OUTBOX_MAX_ATTEMPTS).consume()
+        delivered = [e["event_id"] for e in events if e["event_id"] not in failed]
+        if delivered:
+            session.run(queries.OUTBOX_MARK_DELIVERED, ids=delivered).consume()
+        return len(delivered)
+
+
+_stop = threading.Event()
+_thread = None
+
+
+def _run():
+    while not _stop.is_set():
+        # with several workers only the lease holder dispatches
+        if not is_leader("outbox-dispatcher", OUTBOX_POLL_SECONDS * 10):
+            _stop.wait(OUTBOX_POLL_SECONDS)
+            continue
+        try:
+            delivered = dispatch_once()
+        except Exception as e:
+            logging.warning("Outbox dispatch failed: %s", e)
+            delivered = 0
+        # drain back-to-back while there is a backlog, otherwise poll
+        if delivered < OUTBOX_BATCH_SIZE:
+            _stop.wait(OUTBOX_POLL_SECONDS)
+
+
+def start_dispatcher():
+    global _thread
+    if _thread is not None:
+        return
+    if not _sinks:
+        register_sink(notification_sink, ["booking.accepted"])
+        if OUTBOX_FILE:
+            register_sink(FileSink(OUTBOX_FILE))
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="outbox-dispatcher", daemon=True)
+    _thread.start()
+
+
+def stop_dispatcher():
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
+        _thread = None
@@ -0,0 +1,77 @@
+import argparse
+from datetime import datetime
+from app.db.neo4j_driver import get_driver, neo4j_exceptions
+from app.db import queries
+from app.utils.props import normalize_props
+from app.services.booking_state import COMPLETED
+
+DRIVER = "driver"
+PASSENGER = "passenger"
+
+_RATE_QUERIES = {DRIVER: queries.RATING_RATE_DRIVER, PASSENGER: queries.RATING_RATE_PASSENGER}
+_SUMMARY_QUERIES = {DRIVER: queries.RATING_SUMMARY_DRIVER, PASSENGER: queries.RATING_SUMMARY_USER}
+
+
+class AlreadyRated(ValueError):
+    pass
+
+
+class RatingService:
+    @staticmethod
+    def rate(target: str, target_id: str, data):
+        def work(tx):
+            res = tx.run(_RATE_QUERIES[target], {
+                "booking_id": data.booking_id,
+                "rater_id": data.rater_id,
+                "target": target,
+                "target_id": target_id,
+                "score": data.score,
+                "comment": data.comment,
+                "completed": COMPLETED,
+                "created_at": datetime.utcnow().isoformat(),
+            }).single()
+            if res:
+                return normalize_props(dict(res["r"]))
+            rated = tx.run(queries.RATING_EXISTING, booking_id=data.booking_id, target=target).single()
+            if rated:
+                raise AlreadyRated(f"This ride's {target} has already been rated")
+            raise ValueError("Booking not found, not completed, or not shared by rater and ratee")
+
+        driver = get_driver()
+        with driver.session() as session:
+            try:
+                return session.execute_write(work)
+            except neo4j_exceptions().ConstraintError:
+                # lost a race with a concurrent rating for the same ride
+                raise AlreadyRated(f"This ride's {target} has already been rated")
+
+    @staticmethod
+    def get_summary(target: str, target_id: str):
+        driver = get_driver()
+        with driver.session() as session:
+            res = session.run(_SUMMARY_QUERIES[target], target_id=target_id).single()
+            if not res:
+                return None
+            return {"rating": res["rating"], "rating_count": res["rating_count"]}
+
+    @staticmethod
+    def recompute_all(batch_size: int = 1000):
+        """Rebuild rating_count/rating_sum/rating on every Driver and User from
+        their Rating nodes. Use to backfill or repair the running totals."""
+        driver = get_driver()
+        with driver.session() as session:
+            for query in (queries.RATING_RECOMPUTE_DRIVER, queries.RATING_RECOMPUTE_USER):
+                # CALL ... IN TRANSACTIONS needs an auto-commit transaction, i.e. session.run
+                session.run(query, batch=int(batch_size)).consume()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rating maintenance")
+    parser.add_argument("--recompute", action="store_true", help="rebuild running rating totals from Rating nodes")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    if args.recompute:
+        RatingService.recompute_all(args.batch_size)
+        print("Ratings recomputed")
+    else:
+        parser.print_help()
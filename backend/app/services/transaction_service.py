@@ -1,6 +1,9 @@
 from app.db.neo4j_driver import get_driver
 from uuid import uuid4
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from app.db import queries
+from app.services.outbox import record_event
+from app.utils.idempotency import complete_in
 
 class TransactionService:
     @staticmethod
@@ -12,79 +15,67 @@ class TransactionService:
             raise ValueError("payment_mode must be 'cash' or 'online'")
         status = "pending" if mode == "cash" else "success"
 
-        query = """
-        MATCH (b:Booking {booking_id:$booking_id}),
-              (u:User {user_id:$user_id}),
-              (d:User {user_id:$driver_id})
-        CREATE (t:Transaction {
-            transaction_id:$tx_id,
-            booking_id:$booking_id,
-            user_id:$user_id,
-            driver_id:$driver_id,
-            payment_mode:$payment_mode,
-            payment_status:$status,
-            amount:$amount,
-            created_at: datetime($created_at)
-        })
-        MERGE (u)-[:MADE]->(t)
-        MERGE (b)-[:HAS_TRANSACTION]->(t)
-        MERGE (d)-[:RECEIVED]->(t)
-        RETURN t
-        """
+        params = {
+            "tx_id": tx_id,
+            "booking_id": data.booking_id,
+            "user_id": data.user_id,
+            "driver_id": data.driver_id,
+            "payment_mode": data.payment_mode,
+            "status": status,
+            "amount": data.amount,
+            "created_at": created_at
+        }
+
+        def work(tx):
+            res = tx.run(queries.TRANSACTION_CREATE, params).single()
+            t = dict(res["t"])
+            record_event(tx, "payment.created", t)
+            if status == "success":
+                record_event(tx, "payment.confirmed", t)
+            complete_in(tx, t)
+            return t
+
         driver = get_driver()
         with driver.session() as session:
-            res = session.run(query, {
-                "tx_id": tx_id,
-                "booking_id": data.booking_id,
-                "user_id": data.user_id,
-                "driver_id": data.driver_id,
-                "payment_mode": data.payment_mode,
-                "status": status,
-                "amount": data.amount,
-                "created_at": created_at
-            }).single()
-            return dict(res["t"])
+            return session.execute_write(work)
 
     @staticmethod
     def confirm_cash_payment(transaction_id: str):
-        driver = get_driver()
-        with driver.session() as session:
-            res = session.run("""
-            MATCH (t:Transaction {transaction_id:$tx_id})
-            SET t.payment_status='success'
-            RETURN t
-            """, tx_id=transaction_id).single()
+        def work(tx):
+            res = tx.run(queries.TRANSACTION_CONFIRM, tx_id=transaction_id).single()
             if not res:
                 raise ValueError("Transaction not found")
-            return dict(res["t"])
+            t = dict(res["t"])
+            # confirming twice must not announce the payment twice
+            if res["previous"] != "success":
+                record_event(tx, "payment.confirmed", t)
+            return t
+
+        driver = get_driver()
+        with driver.session() as session:
+            return session.execute_write(work)
 
     @staticmethod
-    def get_user_transactions(user_id: str):
+    def get_user_transactions(user_id: str, include_archived: bool = False):
+        query = queries.TRANSACTION_FOR_USER_WITH_ARCHIVE if include_archived else queries.TRANSACTION_FOR_USER
         driver = get_driver()
         with driver.session() as session:
-            res = session.run("""
-            MATCH (u:User {user_id:$user_id})-[:MADE]->(t:Transaction)
-            RETURN t ORDER BY t.created_at DESC
-            """, user_id=user_id)
+            res = session.run(query, user_id=user_id)
             return [dict(r["t"]) for r in res]
 
     @staticmethod
-    def get_driver_transactions(driver_id: str):
+    def get_driver_transactions(driver_id: str, include_archived: bool = False):
+        query = queries.TRANSACTION_FOR_DRIVER_WITH_ARCHIVE if include_archived else queries.TRANSACTION_FOR_DRIVER
         driver = get_driver()
         with driver.session() as session:
-            res = session.run("""
-            MATCH (d:User {user_id:$driver_id})-[:RECEIVED]->(t:Transaction)
-            RETURN t ORDER BY t.created_at DESC
-            """, driver_id=driver_id)
+            res = session.run(query, driver_id=driver_id)
             return [dict(r["t"]) for r in res]
 
     @staticmethod
     def get_daily_total(date_str: str):
+        day = date.fromisoformat(date_str)
         driver = get_driver()
         with driver.session() as session:
-            res = session.run("""
-            MATCH (t:Transaction)
-            WHERE date(t.created_at) = date($date)
-            RETURN sum(t.amount) AS total
-            """, date=date_str).single()
+            res = session.run(queries.TRANSACTION_DAILY_TOTAL,
+                              start=day.isoformat(), end=(day + timedelta(days=1)).isoformat()).single()
             return {"date": date_str, "total": res["total"] or 0}
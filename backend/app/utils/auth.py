@@ -1,9 +1,7 @@
 import os
 from datetime import datetime, timedelta
 import jwt
-from dotenv import load_dotenv
-
-load_dotenv()
+import app.config  # noqa: F401
 SECRET = os.getenv("JWT_SECRET", "replace-me")
 EXP_MIN = int(os.getenv("JWT_EXP_MINUTES", "60"))
 
@@ -1,12 +1,18 @@
-from passlib.context import CryptContext
+from functools import lru_cache
 
-pwd_ctx = CryptContext(schemes=["argon2"], deprecated="auto")
+
+@lru_cache(maxsize=1)
+def _pwd_ctx():
+    # passlib/argon2 setup is only needed once someone registers or logs in,
+    # so keep it off the import path of every worker
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["argon2"], deprecated="auto")
 
 def hash_password(password: str) -> str:
-    return pwd_ctx.hash(password)
+    return _pwd_ctx().hash(password)
 
 def verify_password(password: str, hashed: str) -> bool:
     try:
-        return pwd_ctx.verify(password, hashed)
+        return _pwd_ctx().verify(password, hashed)
     except Exception:
         return False
@@ -0,0 +1,196 @@
+"""Idempotency-Key support for create endpoints.
+
+A retried request with the same key gets the stored response of the first
+one instead of a second write. Completed responses are kept in a small
+in-process LRU (fast path) and in an ``IdempotencyKey`` node with a unique
+``key`` (shared across workers). Claiming a key is a single MERGE under the
+node's write lock, so concurrent duplicates resolve to exactly one winner;
+the losers get 409 while the winner is still running.
+
+Services that write through a transaction call ``complete_in(tx, result)``
+so the key is marked done in the same commit as the write: a key that is
+still pending then never has a committed write behind it, and taking over a
+stale claim cannot run the write twice.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from contextvars import ContextVar
+from functools import lru_cache
+from uuid import uuid4
+from collections import OrderedDict
+from fastapi.encoders import jsonable_encoder
+from app.db.neo4j_driver import get_driver
+from app.db import queries
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# a pending claim older than this is assumed to belong to a crashed worker; it
+# must outlast a live request (gunicorn's WORKER_TIMEOUT, 60s, plus the
+# driver's 30s execute_write retry window) or a slow winner gets taken over
+IDEMPOTENCY_STALE_SECONDS = int(os.getenv("IDEMPOTENCY_STALE_SECONDS", "300"))
+
+
+class IdempotencyError(Exception):
+    status_code = 409
+
+
+class RequestInProgress(IdempotencyError):
+    status_code = 409
+
+
+class KeyReused(IdempotencyError):
+    status_code = 422
+
+
+class ClaimLost(IdempotencyError):
+    """The claim went stale and another request took the key over."""
+    status_code = 409
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_cache = LRUCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_SECONDS)
+
+# Services may hand back raw node properties; jsonable_encoder would dump a
+# neo4j temporal's private fields, and that would be stored as the response
+# every replay returns. Store them as ISO strings, as FastAPI does for datetime.
+@lru_cache(maxsize=None)
+def _neo4j_encoders():
+    # built on first use so importing this module doesn't load the neo4j package
+    from neo4j.time import Date, DateTime, Time
+    return {t: (lambda v: v.to_native().isoformat()) for t in (Date, DateTime, Time)}
+
+
+# the claim held by the request running on this thread, for complete_in
+_active_claim = ContextVar("idempotency_claim", default=None)
+
+# in-process duplicates wait here instead of bouncing off the DB claim;
+# full key -> [lock, number of requests holding or waiting on it]
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def _fingerprint(body) -> str:
+    raw = json.dumps(jsonable_encoder(body), sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def complete_in(tx, result):
+    """Mark the current request's key done inside ``tx``, the transaction
+    making its write. No-op outside run_idempotent.
+
+    Raises ClaimLost (rolling ``tx`` back) if the claim was taken over.
+    """
+    active = _active_claim.get()
+    if active is None:
+        return
+    response = jsonable_encoder(result, custom_encoder=_neo4j_encoders())
+    r = tx.run(queries.IDEMPOTENCY_FINISH, key=active["key"], claim=active["claim"],
+               response=json.dumps(response)).single()
+    if not r or not r["n"]:
+        raise ClaimLost("The Idempotency-Key was taken over by another request")
+    # execute_write may call the work again; the last call is the one committed
+    active["response"] = response
+
+
+def run_idempotent(scope: str, key, body, fn):
+    """Run ``fn()`` at most once per (scope, key) and return its JSON-able result.
+
+    Without a key this is just ``fn()``. ``body`` is the request payload; reusing
+    a key with a different payload raises KeyReused.
+    """
+    if not key:
+        return fn()
+    full_key = f"{scope}:{key}"
+    fingerprint = _fingerprint(body)
+
+    with _inflight_lock:
+        entry = _inflight.setdefault(full_key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            return _run_claimed(full_key, fingerprint, fn)
+    finally:
+        # drop the lock only once nobody is waiting on it, so a newcomer can't
+        # create a second lock and run alongside the waiters
+        with _inflight_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _inflight[full_key]
+
+
+def _run_claimed(full_key: str, fingerprint: str, fn):
+    cached = _cache.get(full_key)
+    if cached is not None:
+        if cached[0] != fingerprint:
+            raise KeyReused("Idempotency-Key was already used with a different request")
+        return cached[1]
+
+    claim = str(uuid4())
+    driver = get_driver()
+    with driver.session() as session:
+        r = session.run(queries.IDEMPOTENCY_CLAIM, key=full_key, claim=claim, fingerprint=fingerprint,
+                        ttl=IDEMPOTENCY_TTL_SECONDS, stale=IDEMPOTENCY_STALE_SECONDS).single()
+        if r["fingerprint"] != fingerprint:
+            raise KeyReused("Idempotency-Key was already used with a different request")
+        if not r["mine"]:
+            if r["status"] != "done":
+                raise RequestInProgress("A request with this Idempotency-Key is still in progress")
+            response = json.loads(r["response"])
+            _cache.set(full_key, (fingerprint, response))
+            return response
+
+        active = {"key": full_key, "claim": claim, "response": None}
+        token = _active_claim.set(active)
+        try:
+            response = jsonable_encoder(fn(), custom_encoder=_neo4j_encoders())
+        except ClaimLost:
+            raise
+        except Exception:
+            # let the client retry a request that never took effect; a key
+            # completed by a commit that did happen stays done
+            session.run(queries.IDEMPOTENCY_RELEASE, key=full_key, claim=claim).consume()
+            raise
+        finally:
+            _active_claim.reset(token)
+        if active["response"] is not None:
+            # already completed with the write; replays get exactly this
+            response = active["response"]
+        else:
+            session.run(queries.IDEMPOTENCY_FINISH, key=full_key, claim=claim,
+                        response=json.dumps(response)).consume()
+    _cache.set(full_key, (fingerprint, response))
+    return response
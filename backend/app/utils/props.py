@@ -0,0 +1,31 @@
+from datetime import datetime
+
+
+def normalize_props(d: dict) -> dict:
+    """Convert Neo4j temporal types to python native datetimes when possible."""
+    out = {}
+    for k, v in d.items():
+        try:
+            if v is None:
+                out[k] = None
+                continue
+            # neo4j.time.DateTime has to_native()
+            if hasattr(v, "to_native") and callable(getattr(v, "to_native")):
+                out[k] = v.to_native()
+                continue
+            # fallback: if it looks like a date/time-like object, build datetime
+            if hasattr(v, "year") and hasattr(v, "month") and hasattr(v, "day"):
+                try:
+                    hour = getattr(v, "hour", 0)
+                    minute = getattr(v, "minute", 0)
+                    second = getattr(v, "second", 0)
+                    nanosecond = getattr(v, "nanosecond", 0)
+                    microsecond = int(nanosecond / 1000) if nanosecond else 0
+                    out[k] = datetime(int(v.year), int(v.month), int(v.day), int(hour), int(minute), int(second), microsecond)
+                    continue
+                except Exception:
+                    pass
+        except Exception:
+            pass
+        out[k] = v
+    return out
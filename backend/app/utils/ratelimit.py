@@ -0,0 +1,280 @@
+"""Per-client rate limiting and load shedding (plain ASGI middleware).
+
+Requests are grouped into route classes: ``write`` (booking/payment writes),
+``poll`` (status and notification polling loops) and ``read`` (everything
+else). Each (client, class) pair gets a token bucket. On top of that, when
+too many requests are in flight the middleware sheds polling first, then
+other reads, and writes last. Rejections are 429 with ``Retry-After``.
+
+Clients are identified by socket address. ``X-Forwarded-For`` is only used
+when the request comes from one of TRUSTED_PROXIES; otherwise any client
+could pick a new identity per request by changing the header.
+
+Health probes (EXEMPT_PATHS) are never limited or shed, so an overloaded
+worker is not also reported dead by its load balancer.
+
+Under gunicorn every worker decides from its own in-process buckets and a
+background thread reconciles them with the shared ones every
+RATE_LIMIT_SYNC_SECONDS (SyncedBuckets), so a request never waits on the
+shared-state process. Between syncs a client can get up to one extra burst
+per worker.
+"""
+import os
+import math
+import time
+import logging
+import ipaddress
+import threading
+from collections import OrderedDict
+from app.utils.shared_state import Shared
+
+# path prefixes clients poll in a loop
+POLL_PREFIXES = ("/bookings/status/", "/notifications/user/")
+# liveness / readiness probes
+EXEMPT_PATHS = frozenset({"/", "/ready"})
+
+
+def _limit(name: str, default: str):
+    rate, burst = os.getenv(f"RATE_LIMIT_{name.upper()}", default).split(",")
+    return float(rate), float(burst)
+
+
+# class -> (tokens per second, bucket size)
+DEFAULT_LIMITS = {
+    "write": _limit("write", "5,20"),
+    "read": _limit("read", "10,40"),
+    "poll": _limit("poll", "1,5"),
+}
+
+RATE_LIMIT_MAX_INFLIGHT = int(os.getenv("RATE_LIMIT_MAX_INFLIGHT", "64"))
+# fraction of RATE_LIMIT_MAX_INFLIGHT each class may use before being shed
+SHED_THRESHOLDS = {"poll": 0.5, "read": 0.8, "write": 1.0}
+# how often per-worker buckets are reconciled with the shared ones
+RATE_LIMIT_SYNC_SECONDS = float(os.getenv("RATE_LIMIT_SYNC_SECONDS", "1"))
+
+# comma-separated addresses/networks of reverse proxies whose X-Forwarded-For is honoured
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(p.strip(), strict=False)
+    for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()
+]
+
+
+def classify(method: str, path: str) -> str:
+    if method in ("POST", "PUT", "PATCH", "DELETE"):
+        return "write"
+    if path.startswith(POLL_PREFIXES):
+        return "poll"
+    return "read"
+
+
+class LocalBuckets:
+    """In-process token buckets. ``take`` returns 0 when allowed, otherwise
+    the seconds until a token is available.
+
+    Under gunicorn one instance lives in the shared-state process and
+    SyncedBuckets in each worker report to it through ``sync``.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # least recently touched first, so idle buckets are found at the head
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return wait
+
+    def sync(self, usage: dict) -> dict:
+        """Charge tokens taken elsewhere, ``{key: (count, rate, burst)}``, and
+        return the resulting level of each of those buckets.
+
+        Workers overspend between syncs, so a bucket may go into debt (down to
+        ``-burst``), which is then paid back before the client gets through.
+        """
+        now = time.monotonic()
+        levels = {}
+        with self._lock:
+            for key, (count, rate, burst) in usage.items():
+                tokens, last = self._buckets.get(key, (burst, now))
+                tokens = max(-burst, min(burst, tokens + (now - last) * rate) - count)
+                self._buckets[key] = (tokens, now)
+                self._buckets.move_to_end(key)
+                levels[key] = tokens
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return levels
+
+    def set_levels(self, levels: dict):
+        """Overwrite the token count of buckets this instance still has."""
+        now = time.monotonic()
+        with self._lock:
+            for key, tokens in levels.items():
+                if key in self._buckets:
+                    self._buckets[key] = (tokens, now)
+                    self._buckets.move_to_end(key)
+
+    def _prune(self, now: float):
+        # drop buckets idle long enough to have refilled completely; they sit
+        # at the head, so this stops at the first recently used one
+        while self._buckets:
+            _, last = next(iter(self._buckets.values()))
+            if now - last <= 60:
+                break
+            self._buckets.popitem(last=False)
+
+
+class SyncedBuckets:
+    """Per-worker buckets reconciled with shared ones in the background.
+
+    ``take`` only touches the local buckets. Every ``interval`` seconds a
+    daemon thread sends the tokens taken since the last sync to ``shared``
+    (a LocalBuckets, usually behind a Shared handle) and adopts the levels
+    it returns, so all workers converge on the host-wide budget. A slow or
+    unreachable shared-state process only delays the sync.
+    """
+
+    def __init__(self, shared, interval: float = RATE_LIMIT_SYNC_SECONDS):
+        self.shared = shared
+        self.interval = interval
+        self.local = LocalBuckets()
+        # key -> [tokens taken since the last sync, rate, burst]
+        self._used = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        if self._pid != os.getpid():
+            self._start()
+        with self._lock:
+            wait = self.local.take(key, rate, burst)
+            if wait == 0:
+                used = self._used.get(key)
+                if used is None:
+                    self._used[key] = [1, rate, burst]
+                else:
+                    used[0] += 1
+            return wait
+
+    def sync_once(self):
+        with self._lock:
+            used, self._used = self._used, {}
+        if not used:
+            return
+        try:
+            levels = self.shared.sync({k: tuple(v) for k, v in used.items()})
+        except Exception:
+            # report these again next time
+            with self._lock:
+                for key, (count, rate, burst) in used.items():
+                    self._used.setdefault(key, [0, rate, burst])[0] += count
+            raise
+        with self._lock:
+            # tokens taken while the sync was in flight aren't in the shared level yet
+            self.local.set_levels({
+                key: tokens - self._used[key][0] if key in self._used else tokens
+                for key, tokens in levels.items()
+            })
+
+    def _start(self):
+        # (re)started per process: threads don't survive gunicorn's fork
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="ratelimit-sync", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sync_once()
+            except Exception as e:
+                logging.warning("Rate limit sync failed: %s", e)
+
+
+def default_buckets():
+    """Shared-but-local buckets under gunicorn, plain in-process ones otherwise."""
+    if os.getenv("SHARED_STATE_SOCKET"):
+        return SyncedBuckets(Shared("ratelimit_buckets"))
+    return LocalBuckets()
+
+
+def _is_trusted(addr: str, proxies) -> bool:
+    try:
+        ip = ipaddress.ip_address(addr)
+    except ValueError:
+        return False
+    return any(ip in net for net in proxies)
+
+
+def _client_id(scope, proxies=TRUSTED_PROXIES) -> str:
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not proxies or not _is_trusted(peer, proxies):
+        return peer
+    forwarded = []
+    for name, value in scope.get("headers", ()):
+        if name == b"x-forwarded-for":
+            forwarded.extend(v.strip() for v in value.decode("latin-1").split(","))
+    # each proxy appends the address it saw, so walk back from the nearest hop
+    # and stop at the first one we don't trust; entries left of it are client-controlled
+    for addr in reversed(forwarded):
+        if addr and not _is_trusted(addr, proxies):
+            return addr
+    return peer
+
+
+async def _reject(send, retry_after: float, detail: str):
+    body = ('{"detail":"%s"}' % detail).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limits=None, buckets=None, max_inflight: int = RATE_LIMIT_MAX_INFLIGHT):
+        self.app = app
+        self.limits = limits or DEFAULT_LIMITS
+        self.buckets = buckets or default_buckets()
+        self.max_inflight = max_inflight
+        # only touched from the event loop, so no lock needed
+        self.inflight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        cls = classify(scope["method"], scope["path"])
+        if self.inflight >= self.max_inflight * SHED_THRESHOLDS[cls]:
+            return await _reject(send, 1, "Server busy, retry later")
+
+        rate, burst = self.limits[cls]
+        wait = self.buckets.take(f"{_client_id(scope)}:{cls}", rate, burst)
+        if wait > 0:
+            return await _reject(send, wait, "Too many requests")
+
+        self.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.inflight -= 1
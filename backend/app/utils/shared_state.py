@@ -0,0 +1,186 @@
+"""State shared by all workers of one host.
+
+With a single process everything stays in-process. Under gunicorn
+(``gunicorn -c gunicorn_conf.py app.main:app``) the master starts a small
+``multiprocessing`` manager on a Unix socket before forking workers and
+exports SHARED_STATE_SOCKET; workers then reach one shared instance of each
+registered object through a proxy. Proxy calls run in the manager process,
+and the shared objects lock internally, so e.g. ``take()`` on the rate-limit
+buckets stays atomic across workers.
+
+If the manager can't be reached (it died, or the socket is gone), a worker
+falls back to a per-process instance and tries to reconnect every
+SHARED_STATE_RETRY_SECONDS, so requests keep being served meanwhile.
+"""
+import os
+import time
+import logging
+import functools
+import importlib
+import threading
+from multiprocessing.managers import BaseManager
+
+# name -> "module:attr" factory, resolved lazily so the manager process and the
+# workers can import this module without pulling in the services
+SHARED_OBJECTS = {
+    "ratelimit_buckets": "app.utils.ratelimit:LocalBuckets",
+    "driver_presence": "app.services.driver_presence:PresenceRegistry",
+    "leases": "app.utils.shared_state:Leases",
+}
+
+
+class Leases:
+    """Named, expiring leases so one worker runs each singleton background job."""
+
+    def __init__(self):
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            holder, expires = self._owners.get(name, (None, 0))
+            if holder not in (None, owner) and expires > now:
+                return False
+            self._owners[name] = (owner, now + ttl)
+            return True
+
+    def release(self, owner: str) -> int:
+        """Drop every lease ``owner`` holds, so another worker can take over
+        right away instead of waiting for the TTL. Returns how many."""
+        with self._lock:
+            held = [name for name, (holder, _) in self._owners.items() if holder == owner]
+            for name in held:
+                del self._owners[name]
+            return len(held)
+
+
+def _factory(path: str):
+    module, attr = path.split(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def _singleton(name: str):
+    # runs inside the manager process: one instance per name for all workers
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = _factory(SHARED_OBJECTS[name])()
+        return _instances[name]
+
+
+class StateManager(BaseManager):
+    pass
+
+
+# partials of a module-level function pickle, so the manager also starts
+# under the spawn and forkserver start methods (lambdas only work with fork)
+for _name in SHARED_OBJECTS:
+    StateManager.register(_name, callable=functools.partial(_singleton, _name))
+
+
+def _authkey() -> bytes:
+    return os.environ.get("SHARED_STATE_AUTHKEY", "tricy-local").encode()
+
+
+def start_server(path: str, ctx=None):
+    """Start the manager process on a Unix socket (call in the gunicorn master).
+
+    ``ctx`` is an optional multiprocessing context for the manager process.
+    """
+    if os.path.exists(path):
+        os.unlink(path)
+    manager = StateManager(address=path, authkey=_authkey(), ctx=ctx)
+    manager.start()
+    return manager
+
+
+SHARED_STATE_RETRY_SECONDS = float(os.getenv("SHARED_STATE_RETRY_SECONDS", "10"))
+
+# what a dead manager or a missing socket raises (ConnectionRefusedError,
+# FileNotFoundError and BrokenPipeError are OSErrors; a dropped connection EOFError)
+_CONNECTION_ERRORS = (OSError, EOFError)
+
+
+class Shared:
+    """Lazy handle to a shared object.
+
+    Resolves to a manager proxy when SHARED_STATE_SOCKET is set and to a plain
+    local instance otherwise. The proxy is (re)created per process, so handles
+    made before gunicorn forks stay valid in every worker. Only method calls
+    are forwarded.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._pid = None
+        self._target = None
+        self._local = None
+        self._retry_at = None
+        self._lock = threading.Lock()
+
+    def _local_instance(self):
+        if self._local is None:
+            self._local = _factory(SHARED_OBJECTS[self._name])()
+        return self._local
+
+    def _fall_back(self, error):
+        # caller holds self._lock
+        if self._retry_at is None:
+            logging.warning("Shared state '%s' unreachable (%s); using per-process state", self._name, error)
+        self._target = self._local_instance()
+        self._retry_at = time.monotonic() + SHARED_STATE_RETRY_SECONDS
+
+    def _resolve(self):
+        pid = os.getpid()
+        retry = self._retry_at is not None and time.monotonic() >= self._retry_at
+        if self._pid != pid or retry:
+            with self._lock:
+                retry = self._retry_at is not None and time.monotonic() >= self._retry_at
+                if self._pid != pid or retry:
+                    socket = os.getenv("SHARED_STATE_SOCKET", "")
+                    if socket:
+                        try:
+                            manager = StateManager(address=socket, authkey=_authkey())
+                            manager.connect()
+                            self._target = getattr(manager, self._name)()
+                            if self._retry_at is not None:
+                                logging.info("Shared state '%s' reconnected", self._name)
+                            self._retry_at = None
+                        except _CONNECTION_ERRORS as e:
+                            self._fall_back(e)
+                    else:
+                        self._target = self._local_instance()
+                    self._pid = pid
+        return self._target
+
+    def __getattr__(self, attr):
+        target = self._resolve()
+        if target is self._local:
+            return getattr(target, attr)
+
+        def call(*args, **kwargs):
+            try:
+                return getattr(target, attr)(*args, **kwargs)
+            except _CONNECTION_ERRORS as e:
+                with self._lock:
+                    if self._target is target:
+                        self._fall_back(e)
+                return getattr(self._target, attr)(*args, **kwargs)
+        return call
+
+
+leases = Shared("leases")
+
+
+def is_leader(job: str, ttl: float) -> bool:
+    """True if this process holds (or just took) the lease for ``job``."""
+    return leases.acquire(job, str(os.getpid()), ttl)
+
+
+def release_leases(pid=None) -> int:
+    """Give up the leases held by ``pid`` (default: this process)."""
+    return leases.release(str(pid or os.getpid()))
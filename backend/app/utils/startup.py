@@ -0,0 +1,47 @@
+"""Startup timing and readiness.
+
+Set STARTUP_PROFILE=1 to log how long each router import and each init step
+took, plus total time-to-ready. `python -X importtime -m uvicorn app.main:app`
+gives the per-module import breakdown below that.
+"""
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") == "1"
+
+_t0 = time.perf_counter()
+_timings = []
+_ready = threading.Event()
+
+
+@contextmanager
+def timed(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings.append((name, time.perf_counter() - start))
+
+
+def mark_ready():
+    _timings.append(("time to ready", time.perf_counter() - _t0))
+    _ready.set()
+    if STARTUP_PROFILE:
+        report()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def timings():
+    return [{"step": name, "ms": round(secs * 1000, 1)} for name, secs in _timings]
+
+
+def report():
+    width = max((len(name) for name, _ in _timings), default=0)
+    lines = [f"  {name:<{width}}  {secs * 1000:9.1f} ms" for name, secs in _timings]
+    logging.warning("Startup profile:\n%s", "\n".join(lines))
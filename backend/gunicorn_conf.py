@@ -0,0 +1,51 @@
+"""gunicorn settings for running several uvicorn workers on one host.
+
+    gunicorn -c gunicorn_conf.py app.main:app
+
+WEB_CONCURRENCY sets the worker count (default: one per CPU core).
+NEO4J_MAX_CONNECTIONS is the total connection budget for this host and is
+split evenly across workers (see app.db.neo4j_driver).
+"""
+import os
+import multiprocessing
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# workers read these when they create their driver pool / connect to shared state
+os.environ["WEB_CONCURRENCY"] = str(workers)
+SHARED_STATE_SOCKET = os.getenv("SHARED_STATE_SOCKET", f"/tmp/tricy-shared-{os.getpid()}.sock")
+
+_manager = None
+
+
+def on_starting(server):
+    # started before any worker forks, so every worker inherits the socket path
+    global _manager
+    from app.utils.shared_state import start_server
+    if "SHARED_STATE_AUTHKEY" not in os.environ:
+        os.environ["SHARED_STATE_AUTHKEY"] = os.urandom(16).hex()
+    _manager = start_server(SHARED_STATE_SOCKET)
+    os.environ["SHARED_STATE_SOCKET"] = SHARED_STATE_SOCKET
+    server.log.info("Shared state manager listening on %s", SHARED_STATE_SOCKET)
+
+
+def child_exit(server, worker):
+    # a replacement worker gets a new pid; free the old one's leases so the
+    # archiver/dispatcher move on now instead of when the lease expires
+    if _manager is not None:
+        try:
+            _manager.leases().release(str(worker.pid))
+        except Exception as e:
+            server.log.warning("Could not release leases of worker %s: %s", worker.pid, e)
+
+
+def on_exit(server):
+    if _manager is not None:
+        _manager.shutdown()
+    if os.path.exists(SHARED_STATE_SOCKET):
+        os.unlink(SHARED_STATE_SOCKET)
@@ -0,0 +1,90 @@
+"""Per-request overhead of RateLimitMiddleware.
+
+Drives a no-op ASGI app directly (no server, no network) with GET requests
+spread over many client addresses, once bare and once wrapped in the
+middleware, and prints microseconds per request for both.
+
+    python scripts/bench_ratelimit.py --requests 200000 --clients 200
+
+Run from the backend folder. Limits are set high enough that every request
+takes the allowed path; pass --limit to measure with real limits instead
+(rejected requests are counted separately).
+
+By default the buckets are in-process. --shared starts a shared-state manager
+(as gunicorn_conf does) and measures the buckets the middleware uses under
+gunicorn instead.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.ratelimit import RateLimitMiddleware, LocalBuckets  # noqa: E402
+from app.utils.shared_state import start_server  # noqa: E402
+
+
+async def noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def drive(app, scopes):
+    statuses = {}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses[message["status"]] = statuses.get(message["status"], 0) + 1
+
+    start = time.perf_counter()
+    for scope in scopes:
+        await app(scope, _receive, send)
+    return time.perf_counter() - start, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rate limit middleware overhead")
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--path", default="/drivers/available/count")
+    parser.add_argument("--limit", help="read limit as rate,burst (default: effectively unlimited)")
+    parser.add_argument("--shared", action="store_true", help="use the shared-state manager's buckets")
+    args = parser.parse_args()
+
+    scopes = [{
+        "type": "http", "method": "GET", "path": args.path, "headers": [],
+        "client": (f"10.{(i % args.clients) // 256}.{(i % args.clients) % 256}.1", 40000),
+    } for i in range(args.requests)]
+    rate, burst = (float(x) for x in args.limit.split(",")) if args.limit else (1e9, 1e9)
+    limits = {"write": (rate, burst), "read": (rate, burst), "poll": (rate, burst)}
+
+    manager = None
+    if args.shared:
+        path = os.path.join(tempfile.mkdtemp(), "shared.sock")
+        manager = start_server(path)
+        os.environ["SHARED_STATE_SOCKET"] = path
+        # None: the middleware picks the buckets it would use under gunicorn
+        buckets = None
+    else:
+        buckets = LocalBuckets()
+    wrapped = RateLimitMiddleware(noop_app, limits=limits, buckets=buckets, max_inflight=10**9)
+
+    try:
+        for name, app in (("bare", noop_app), ("middleware", wrapped)):
+            asyncio.run(drive(app, scopes[:1000]))  # warm up
+            elapsed, statuses = asyncio.run(drive(app, scopes))
+            print(f"{name:11} {elapsed / args.requests * 1e6:6.2f} us/request  statuses={statuses}")
+    finally:
+        if manager is not None:
+            manager.shutdown()
+
+
+if __name__ == "__main__":
+    main()
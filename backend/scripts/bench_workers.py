@@ -0,0 +1,111 @@
+"""Throughput vs. worker count for the gunicorn deployment mode.
+
+Starts `gunicorn -c gunicorn_conf.py app.main:app` with 1, 2, 4, ... workers
+(up to --max-workers), drives it with several client processes for a fixed
+duration and prints requests/second for each worker count.
+
+    python scripts/bench_workers.py --max-workers 4 --path /drivers/available/count
+
+Run from the backend folder. Rate limiting is disabled for the server under
+test, since all load comes from a single client address; --rate-limit keeps
+the middleware on with limits too high to reject anything, to include its
+cost (and its shared-state sync) in the numbers.
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import subprocess
+import http.client
+import multiprocessing
+
+
+def _client(port, path, duration, out):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    done = errors = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        try:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status == 200:
+                done += 1
+            else:
+                errors += 1
+        except Exception:
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+    out.put((done, errors))
+
+
+def _wait_ready(port, timeout=30):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("server did not come up")
+
+
+def run(workers, args):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{args.port}", RATE_LIMIT_ENABLED="0")
+    if args.rate_limit:
+        unlimited = "1000000000,1000000000"
+        env.update(RATE_LIMIT_ENABLED="1", RATE_LIMIT_READ=unlimited, RATE_LIMIT_POLL=unlimited,
+                   RATE_LIMIT_WRITE=unlimited, RATE_LIMIT_MAX_INFLIGHT="1000000")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "app.main:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(args.port)
+        out = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=_client, args=(args.port, args.path, args.duration, out))
+                   for _ in range(args.clients)]
+        for c in clients:
+            c.start()
+        results = [out.get() for _ in clients]
+        for c in clients:
+            c.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+    done = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return done / args.duration, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--clients", type=int, default=2 * multiprocessing.cpu_count())
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate-limit", action="store_true", help="keep the rate limit middleware on")
+    args = parser.parse_args()
+
+    counts, n = [], 1
+    while n <= args.max_workers:
+        counts.append(n)
+        n *= 2
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    base = None
+    print(f"{'workers':>7}  {'req/s':>10}  {'speedup':>7}  errors")
+    for workers in counts:
+        rps, errors = run(workers, args)
+        base = base or rps
+        print(f"{workers:>7}  {rps:>10.0f}  {rps / base:>6.2f}x  {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pytest
+
+# run from anywhere: the app package lives in backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# the tests never talk to a real database or shared-state manager
+os.environ.pop("SHARED_STATE_SOCKET", None)
+
+
+class FakeResult(list):
+    """What ``session.run`` returns: the rows, plus single() and consume()."""
+
+    def single(self):
+        return self[0] if self else None
+
+    def consume(self):
+        return None
+
+
+class FakeSession:
+    """Session and transaction in one. ``handler(query, params)`` answers each
+    query with a list of rows, a single row (dict) or None."""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def run(self, query, params=None, **kwargs):
+        rows = self.handler(query, {**(params or {}), **kwargs})
+        if rows is None:
+            return FakeResult()
+        return FakeResult([rows] if isinstance(rows, dict) else rows)
+
+    def execute_write(self, work):
+        return work(self)
+
+    execute_read = execute_write
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeDriver:
+    def __init__(self, handler):
+        self.handler = handler
+
+    def session(self, **kwargs):
+        return FakeSession(self.handler)
+
+
+@pytest.fixture
+def fake_session():
+    """Build a FakeSession from a query handler."""
+    return FakeSession
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Point ``module.get_driver`` at a FakeDriver answering with ``handler``."""
+    def install(module, handler):
+        driver = FakeDriver(handler)
+        monkeypatch.setattr(module, "get_driver", lambda: driver)
+        return driver
+    return install
@@ -0,0 +1,71 @@
+"""The TRANSITIONS table and the transition() guard."""
+import pytest
+
+from app.db import queries
+from app.services import booking_state
+from app.services.booking_state import (
+    REQUESTED, ACCEPTED, ONGOING, COMPLETED, CANCELLED, InvalidTransition, UnknownDriver,
+)
+
+
+class FakeBookings:
+    """Evaluates the transition queries' status guard against a dict."""
+
+    def __init__(self, drivers=("d1",), **statuses):
+        self.drivers = set(drivers)
+        self.statuses = statuses
+
+    def __call__(self, query, p):
+        if query == queries.DRIVER_EXISTS:
+            return {"exists": p["driver_id"] in self.drivers}
+        status = self.statuses.get(p["booking_id"])
+        if query == queries.BOOKING_STATUS:
+            return None if status is None else {"status": status}
+        assert query == booking_state._QUERIES[p["target"]]
+        if status not in p["from_statuses"]:
+            return None
+        if p["target"] == ACCEPTED and p["driver_id"] not in self.drivers:
+            return None
+        self.statuses[p["booking_id"]] = p["target"]
+        return {"b": {"booking_id": p["booking_id"], "status": p["target"]}, "driver_id": "d1"}
+
+
+ALL = (REQUESTED, ACCEPTED, ONGOING, COMPLETED, CANCELLED)
+ALLOWED = {
+    (REQUESTED, ACCEPTED), (REQUESTED, CANCELLED),
+    (ACCEPTED, ONGOING), (ACCEPTED, COMPLETED), (ACCEPTED, CANCELLED),
+    (ONGOING, COMPLETED),
+}
+
+
+@pytest.mark.parametrize("current,target", [(c, t) for c in ALL for t in booking_state.TRANSITIONS])
+def test_transition(fake_session, current, target):
+    bookings = FakeBookings(b1=current)
+    session = fake_session(bookings)
+    if (current, target) in ALLOWED:
+        assert booking_state.transition(session, "b1", target, driver_id="d1")["status"] == target
+        assert bookings.statuses["b1"] == target
+    else:
+        with pytest.raises(InvalidTransition) as err:
+            booking_state.transition(session, "b1", target, driver_id="d1")
+        assert (err.value.current, err.value.target) == (current, target)
+        assert bookings.statuses["b1"] == current
+
+
+def test_accept_by_unknown_driver(fake_session):
+    bookings = FakeBookings(b1=REQUESTED)
+    with pytest.raises(UnknownDriver):
+        booking_state.transition(fake_session(bookings), "b1", ACCEPTED, driver_id="ghost")
+    assert bookings.statuses["b1"] == REQUESTED
+    # a booking that can't be accepted anyway still reports the state
+    with pytest.raises(InvalidTransition):
+        booking_state.transition(fake_session(FakeBookings(b1=ONGOING)), "b1", ACCEPTED, driver_id="ghost")
+
+
+def test_missing_booking(fake_session):
+    assert booking_state.transition(fake_session(FakeBookings()), "nope", CANCELLED) is None
+
+
+def test_unknown_target(fake_session):
+    with pytest.raises(ValueError):
+        booking_state.transition(fake_session(FakeBookings(b1=REQUESTED)), "b1", REQUESTED)
@@ -0,0 +1,90 @@
+"""PresenceRegistry expiry and the flush/reconcile round trip to the graph."""
+import pytest
+
+from app.db import queries
+from app.services import driver_presence
+from app.services.driver_presence import PresenceRegistry, ONLINE, BUSY, OFFLINE
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(driver_presence.time, "monotonic", lambda: now[0])
+    return now
+
+
+class FakeGraph:
+    """Driver.availability_status by id, driven by the presence queries."""
+
+    def __init__(self, **statuses):
+        self.statuses = statuses
+        self.fail = False
+
+    def __call__(self, query, p):
+        if query == queries.DRIVER_PRESENCE_FLUSH:
+            if self.fail:
+                raise ConnectionError("database unavailable")
+            for row in p["rows"]:
+                self.statuses[row["driver_id"]] = row["status"]
+            return None
+        assert query == queries.DRIVER_PERSISTED_AVAILABLE
+        return [{"driver_id": d} for d, s in self.statuses.items() if s in p["statuses"]]
+
+
+@pytest.fixture
+def graph(fake_db):
+    g = FakeGraph()
+    fake_db(driver_presence, g)
+    return g
+
+
+def test_heartbeat_ttl_expiry(clock):
+    reg = PresenceRegistry(ttl=60)
+    reg.set_status("d1", ONLINE)
+    reg.set_status("d2", ONLINE)
+    clock[0] += 40
+    assert reg.heartbeat("d1") == ONLINE
+    clock[0] += 30
+    # d2's last heartbeat is 70s old, d1's only 30s
+    assert reg.status("d2") == OFFLINE
+    assert reg.available() == ["d1"]
+    assert reg.heartbeat("d2") is None
+    assert reg.drain_dirty()["d2"][0] == OFFLINE
+
+
+def test_busy_driver_is_released(clock):
+    reg = PresenceRegistry(ttl=60)
+    reg.set_status("d1", BUSY)
+    assert reg.available_count() == 0
+    assert reg.release("d1") == ONLINE
+    assert reg.available() == ["d1"]
+    # an offline driver stays offline
+    assert reg.release("d2") == OFFLINE
+    assert reg.available_count() == 1
+
+
+def test_flush_writes_dirty_once_and_keeps_it_on_failure(clock, graph):
+    reg = PresenceRegistry(ttl=60)
+    reg.set_status("d1", ONLINE)
+    reg.set_status("d2", BUSY)
+
+    graph.fail = True
+    with pytest.raises(ConnectionError):
+        driver_presence.flush(reg)
+    # a newer change made while the batch was out wins over the restored one
+    reg.set_status("d2", OFFLINE)
+    graph.fail = False
+
+    assert driver_presence.flush(reg) == 2
+    assert graph.statuses == {"d1": ONLINE, "d2": OFFLINE}
+    assert driver_presence.flush(reg) == 0
+
+
+def test_reconcile_sets_unknown_drivers_offline(clock, graph):
+    # persisted before a restart; only d1 has reported in since
+    graph.statuses.update(d1=ONLINE, d2=BUSY, d3=OFFLINE)
+    reg = PresenceRegistry(ttl=60)
+    reg.set_status("d1", ONLINE)
+
+    assert driver_presence.reconcile(reg) == 1
+    assert graph.statuses == {"d1": ONLINE, "d2": OFFLINE, "d3": OFFLINE}
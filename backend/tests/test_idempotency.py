@@ -0,0 +1,136 @@
+"""Concurrent retries with one Idempotency-Key must produce a single write."""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.db import queries
+from app.routers import bookings
+from app.utils import idempotency
+from app.utils.idempotency import RequestInProgress, ClaimLost
+
+
+class FakeKeyStore:
+    """In-memory stand-in for the IdempotencyKey node and its write lock."""
+
+    def __init__(self):
+        self.keys = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, query, p):
+        with self.lock:
+            if query == queries.IDEMPOTENCY_CLAIM:
+                k = self.keys.setdefault(p["key"], {
+                    "status": "pending", "fingerprint": p["fingerprint"], "claim": p["claim"], "response": None,
+                })
+                return {"mine": k["claim"] == p["claim"], **k}
+            k = self.keys.get(p["key"])
+            mine = k is not None and k["claim"] == p["claim"]
+            if query == queries.IDEMPOTENCY_FINISH:
+                if mine:
+                    k.update(status="done", response=p["response"])
+                return {"n": int(mine)}
+            if query == queries.IDEMPOTENCY_RELEASE and mine and k["status"] == "pending":
+                del self.keys[p["key"]]
+            return None
+
+
+@pytest.fixture
+def store(fake_db):
+    s = FakeKeyStore()
+    fake_db(idempotency, s)
+    idempotency._cache.clear()
+    yield s
+    idempotency._cache.clear()
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    calls = []
+
+    def create_booking(data):
+        calls.append(data)
+        time.sleep(0.2)  # keep the first request in flight while the retries arrive
+        return {"booking_id": f"b{len(calls)}", "user_id": data.user_id, "status": "requested",
+                "pickup_location": data.pickup_location, "dropoff_location": data.dropoff_location,
+                "fare": data.fare, "created_at": "2024-01-01T00:00:00"}
+
+    monkeypatch.setattr(bookings.BookingService, "create_booking", staticmethod(create_booking))
+    return calls
+
+
+BODY = {"user_id": "u1", "pickup_location": "A", "dropoff_location": "B", "fare": 40.0}
+
+
+def test_parallel_retries_write_once(store, writes):
+    api = FastAPI()
+    api.include_router(bookings.router)
+    client = TestClient(api)
+
+    def post(_):
+        return client.post("/bookings", json=BODY, headers={"Idempotency-Key": "retry-1"})
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(post, range(8)))
+
+    assert len(writes) == 1
+    assert [r.status_code for r in responses] == [200] * 8
+    assert {r.json()["booking_id"] for r in responses} == {"b1"}
+    assert idempotency._inflight == {}
+
+
+def test_parallel_retries_across_workers_write_once(store):
+    # workers don't share the in-process lock; the DB claim alone must pick one winner
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"booking_id": "b1"}
+
+    def attempt(_):
+        try:
+            return idempotency._run_claimed("bookings.create:retry-2", "fp", fn)
+        except RequestInProgress:
+            return "in progress"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(attempt, range(8)))
+
+    assert len(calls) == 1
+    assert results.count({"booking_id": "b1"}) == 1
+    assert results.count("in progress") == 7
+    # once the winner is done, a retry replays its response
+    assert idempotency._run_claimed("bookings.create:retry-2", "fp", fn) == {"booking_id": "b1"}
+    assert len(calls) == 1
+
+
+def test_key_completed_with_the_write_survives_a_later_failure(store):
+    # the write and the key commit together; losing the connection afterwards
+    # must not reopen the key for a second write
+    calls = []
+
+    def fn():
+        calls.append(1)
+        idempotency.get_driver().session().execute_write(lambda tx: idempotency.complete_in(tx, {"booking_id": "b1"}))
+        raise ConnectionError("lost the connection after commit")
+
+    with pytest.raises(ConnectionError):
+        idempotency._run_claimed("bookings.create:retry-3", "fp", fn)
+    assert store.keys["bookings.create:retry-3"]["status"] == "done"
+    assert idempotency._run_claimed("bookings.create:retry-3", "fp", fn) == {"booking_id": "b1"}
+    assert len(calls) == 1
+
+
+def test_taken_over_claim_rolls_back_the_write(store):
+    def fn():
+        # another request took the stale claim over while this one was running
+        store.keys["bookings.create:retry-4"]["claim"] = "someone-else"
+        return idempotency.get_driver().session().execute_write(lambda tx: idempotency.complete_in(tx, {"booking_id": "b1"}))
+
+    with pytest.raises(ClaimLost):
+        idempotency._run_claimed("bookings.create:retry-4", "fp", fn)
+    assert store.keys["bookings.create:retry-4"]["claim"] == "someone-else"
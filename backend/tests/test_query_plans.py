@@ -0,0 +1,26 @@
+"""The offline half of the plan check: sample params and baseline comparison."""
+from app.db import query_plans
+from app.db.queries import REGISTRY
+
+
+def test_every_query_has_sample_params():
+    missing = {name: query_plans.missing_params(q) for name, q in REGISTRY.items()}
+    assert {name: m for name, m in missing.items() if m} == {}
+
+
+def test_check_fails_on_changed_plan_missing_baseline_and_errors():
+    baseline = {"user.get": {"operators": ["NodeUniqueIndexSeek", "ProduceResults"], "db_hits": 4}}
+    results = {
+        "user.get": {"operators": ["NodeIndexSeek", "ProduceResults"], "db_hits": 4},
+        "user.by_email": {"operators": ["NodeUniqueIndexSeek", "ProduceResults"], "db_hits": 4},
+        "user.list": {"error": "ParameterMissing: Expected parameter(s): limit"},
+    }
+    failures = query_plans.check(results, baseline, tolerance=1.5)
+
+    assert len(failures) == 3
+    assert failures[0].startswith("user.get: plan changed (added ['NodeIndexSeek'], "
+                                  "removed ['NodeUniqueIndexSeek'])")
+    assert failures[1].startswith("user.by_email: not in the baseline")
+    assert failures[2] == "user.list: ParameterMissing: Expected parameter(s): limit"
+    # an unchanged plan within budget passes
+    assert query_plans.check({"user.get": baseline["user.get"]}, baseline, tolerance=1.5) == []
@@ -0,0 +1,98 @@
+import time
+import asyncio
+import ipaddress
+import threading
+
+from app.utils import ratelimit
+from app.utils.ratelimit import RateLimitMiddleware, LocalBuckets, SyncedBuckets
+
+
+async def _ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _poll(app, peer, forwarded):
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    scope = {"type": "http", "method": "GET", "path": "/bookings/status/b1", "client": (peer, 1234),
+             "headers": [(b"x-forwarded-for", forwarded.encode())]}
+    asyncio.run(app(scope, None, send))
+    return statuses[0]
+
+
+def test_spoofed_forwarded_for_is_ignored():
+    app = RateLimitMiddleware(_ok, buckets=LocalBuckets())
+    statuses = [_poll(app, "203.0.113.7", f"198.51.100.{i}") for i in range(8)]
+    burst = int(ratelimit.DEFAULT_LIMITS["poll"][1])
+    assert statuses == [200] * burst + [429] * (8 - burst)
+
+
+def test_probes_are_never_limited_or_shed():
+    app = RateLimitMiddleware(_ok, buckets=LocalBuckets(), max_inflight=0)
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    for path in ("/", "/ready", "/bookings/b1"):
+        scope = {"type": "http", "method": "GET", "path": path, "client": ("203.0.113.7", 1), "headers": []}
+        asyncio.run(app(scope, None, send))
+    assert statuses == [200, 200, 429]
+
+
+def test_prune_drops_only_idle_buckets(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    buckets = LocalBuckets(max_keys=2)
+    buckets.take("old", 1, 5)
+    now[0] += 30
+    buckets.take("recent", 1, 5)
+    now[0] += 40
+    # "old" has been idle 70s, "recent" 40s
+    buckets.take("new", 1, 5)
+    assert list(buckets._buckets) == ["recent", "new"]
+
+
+def test_synced_buckets_share_one_budget():
+    shared = LocalBuckets()
+    # two workers; the interval is long enough that only the explicit syncs run
+    a, b = SyncedBuckets(shared, interval=3600), SyncedBuckets(shared, interval=3600)
+    # a bucket of 3 that practically never refills
+    assert [a.take("client:write", 0.001, 3) for _ in range(3)] == [0, 0, 0]
+    a.sync_once()
+    # b hasn't heard of the client yet, so its first request gets through...
+    assert b.take("client:write", 0.001, 3) == 0
+    b.sync_once()
+    # ...but after syncing it sees the budget is spent, and is in debt for the extra one
+    assert b.take("client:write", 0.001, 3) > 0
+    assert shared.sync({"client:write": (0, 0.001, 3)})["client:write"] < 0
+
+
+def test_stalled_shared_state_does_not_block_take():
+    stalled = threading.Event()
+
+    class Stalled:
+        def sync(self, usage):
+            stalled.set()
+            time.sleep(5)
+
+    buckets = SyncedBuckets(Stalled(), interval=0.01)
+    buckets.take("client:read", 10, 40)
+    assert stalled.wait(2)
+    start = time.perf_counter()
+    assert [buckets.take("client:read", 10, 40) for _ in range(10)] == [0] * 10
+    assert time.perf_counter() - start < 0.5
+
+
+def test_forwarded_for_from_trusted_proxy():
+    proxies = [ipaddress.ip_network("10.0.0.0/8")]
+    scope = {"client": ("10.0.0.2", 1), "headers": [(b"x-forwarded-for", b"6.6.6.6, 198.51.100.4, 10.0.0.9")]}
+    # the left-most entry is whatever the client sent; the nearest untrusted hop is the client
+    assert ratelimit._client_id(scope, proxies) == "198.51.100.4"
+    assert ratelimit._client_id({**scope, "client": ("203.0.113.7", 1)}, proxies) == "203.0.113.7"
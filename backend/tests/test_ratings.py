@@ -0,0 +1,57 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from neo4j.exceptions import ConstraintError
+from neo4j.time import DateTime
+
+from app.routers import ratings
+from app.services import rating_service
+
+
+class RateQuery:
+    """Answers the rate query with a Rating node as the driver returns it."""
+
+    def __init__(self):
+        self.params = None
+
+    def __call__(self, query, params):
+        self.params = params
+        node = {
+            "rating_id": f"{params['booking_id']}:{params['target']}", "booking_id": params["booking_id"],
+            "rater_id": params["rater_id"], "target": params["target"], "target_id": params["target_id"],
+            "score": params["score"], "comment": params["comment"],
+            # neo4j temporals, not datetime, come back from the driver
+            "created_at": DateTime(2024, 5, 1, 12, 30, 0),
+        }
+        return {"r": node}
+
+
+def test_post_driver_rating(fake_db):
+    rate = RateQuery()
+    fake_db(rating_service, rate)
+    api = FastAPI()
+    api.include_router(ratings.router)
+
+    resp = TestClient(api).post("/ratings/driver/d1/rate",
+                                json={"booking_id": "b1", "rater_id": "u1", "score": 5, "comment": "smooth"})
+
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert body["rating_id"] == "b1:driver"
+    assert body["target_id"] == "d1"
+    assert body["created_at"] == "2024-05-01T12:30:00"
+    assert rate.params["score"] == 5
+
+
+def test_concurrent_duplicate_rating_is_409(fake_db):
+    def lose_race(query, params):
+        # the unique constraint on the rating caught a concurrent write
+        raise ConstraintError("Node already exists with label `Rating`")
+
+    fake_db(rating_service, lose_race)
+    api = FastAPI()
+    api.include_router(ratings.router)
+
+    resp = TestClient(api).post("/ratings/driver/d1/rate",
+                                json={"booking_id": "b1", "rater_id": "u1", "score": 5})
+
+    assert resp.status_code == 409, resp.text
@@ -0,0 +1,92 @@
+"""Multi-worker mode: one manager process shares state across workers."""
+import multiprocessing
+
+import pytest
+
+from app.utils.shared_state import Shared, start_server, is_leader, release_leases
+
+# the workers gunicorn forks; fork also carries over sys.path and the env
+ctx = multiprocessing.get_context("fork")
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    path = str(tmp_path / "shared.sock")
+    monkeypatch.setenv("SHARED_STATE_AUTHKEY", "test-key")
+    m = start_server(path)
+    monkeypatch.setenv("SHARED_STATE_SOCKET", path)
+    yield m
+    m.shutdown()
+
+
+def _worker(name, out):
+    buckets = Shared("ratelimit_buckets")
+    leases = Shared("leases")
+    # a bucket of 3 that practically never refills
+    waits = [buckets.take("client:write", 0.001, 3) for _ in range(2)]
+    out.put((name, waits, leases.acquire("archiver", name, 60)))
+
+
+def _run_workers(*names):
+    out = ctx.Queue()
+    results = {}
+    for name in names:
+        # one after the other, so the outcome doesn't depend on scheduling
+        p = ctx.Process(target=_worker, args=(name, out))
+        p.start()
+        name, waits, leader = out.get(timeout=10)
+        p.join(timeout=10)
+        results[name] = (waits, leader)
+    return results
+
+
+def test_buckets_and_leases_are_shared_across_processes(manager):
+    results = _run_workers("worker-1", "worker-2")
+
+    waits = results["worker-1"][0] + results["worker-2"][0]
+    assert [w == 0 for w in waits] == [True, True, True, False]
+    assert results["worker-1"][1] is True
+    assert results["worker-2"][1] is False
+
+
+def test_falls_back_to_local_state_when_manager_dies(manager):
+    buckets = Shared("ratelimit_buckets")
+    assert buckets.take("client:read", 1, 5) == 0
+
+    manager.shutdown()
+
+    # served from a per-process bucket instead of failing the request
+    assert buckets.take("client:read", 1, 5) == 0
+
+
+def test_unreachable_socket_uses_local_state(tmp_path, monkeypatch):
+    monkeypatch.setenv("SHARED_STATE_SOCKET", str(tmp_path / "missing.sock"))
+    leases = Shared("leases")
+    assert leases.acquire("outbox-dispatcher", "a", 60) is True
+    assert leases.acquire("outbox-dispatcher", "b", 60) is False
+
+
+def test_manager_starts_with_spawn(tmp_path, monkeypatch):
+    # no fork: the registered factories have to be picklable
+    path = str(tmp_path / "spawn.sock")
+    monkeypatch.setenv("SHARED_STATE_AUTHKEY", "test-key")
+    m = start_server(path, ctx=multiprocessing.get_context("spawn"))
+    try:
+        monkeypatch.setenv("SHARED_STATE_SOCKET", path)
+        assert Shared("ratelimit_buckets").take("client:read", 1, 5) == 0
+    finally:
+        m.shutdown()
+
+
+def test_exited_worker_leases_are_released(manager):
+    # worker-1 took the lease and exited; the master releases it by pid
+    assert _run_workers("worker-1")["worker-1"][1] is True
+    assert Shared("leases").acquire("archiver", "worker-2", 60) is False
+    assert manager.leases().release("worker-1") == 1
+    assert Shared("leases").acquire("archiver", "worker-2", 60) is True
+
+
+def test_shutdown_releases_own_leases(manager):
+    assert is_leader("outbox-dispatcher", 60) is True
+    assert release_leases() == 1
+    assert Shared("leases").acquire("outbox-dispatcher", "other", 60) is True